@@ -1,25 +1,115 @@
 # database.py
+import atexit
 import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import bcrypt
 
 DB_NAME = "library.db"
 
-def dict_factory(cursor, row):
-    d = {}
-    for idx, col in enumerate(cursor.description):
-        d[col[0]] = row[idx]
-    return d
+# set by init_db once the books_fts full-text table is available
+FTS_ENABLED = False
+
+# per-connection tuning, applied once when a thread opens its connection
+# (journal_mode=WAL is stored in the database file and is set by init_db)
+PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-65536",
+)
+
+# number of distinct SQL statements whose cursors are kept per connection
+STMT_CACHE_SIZE = 64
+
+# one connection per thread, reused for every query made from that thread
+_tls = threading.local()
+
+class CachedConn:
+    """
+    Wraps a sqlite3 connection and keeps one cursor per SQL text (LRU, STMT_CACHE_SIZE
+    entries), so hot statements re-run on an already prepared cursor.
+
+    Rows of a cached cursor are only valid until the same SQL is executed again,
+    so fetch results before re-running a statement.
+    """
+    def __init__(self, conn, size=STMT_CACHE_SIZE):
+        self._conn = conn
+        self._size = size
+        self._cache = OrderedDict()
+
+    def execute(self, sql, params=()):
+        cur = self._cache.get(sql)
+        if cur is None:
+            cur = self._conn.cursor()
+            self._cache[sql] = cur
+            if len(self._cache) > self._size:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(sql)
+        return cur.execute(sql, params)
+
+    def cursor(self):
+        return self._conn.cursor()
+
+    def executemany(self, sql, seq_of_params):
+        return self._conn.executemany(sql, seq_of_params)
+
+    def commit(self):
+        self._conn.commit()
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._conn.__exit__(exc_type, exc, tb)
+
+    def close(self):
+        self._cache.clear()
+        self._conn.close()
+
+def rows_as_dicts(rows):
+    # for API boundaries that need real dicts (mutable, .get()) rather than sqlite3.Row
+    return [dict(r) for r in rows]
 
 def get_connection():
-    conn = sqlite3.connect(DB_NAME, detect_types=sqlite3.PARSE_DECLTYPES|sqlite3.PARSE_COLNAMES)
-    conn.row_factory = dict_factory
-    return conn
+    conn = getattr(_tls, "conn", None)
+    if conn is not None:
+        return conn
+    # no detect_types: every column is INTEGER/REAL/TEXT, so there is nothing to convert and
+    # the per-column converter lookup on each fetched row is pure overhead
+    conn = sqlite3.connect(DB_NAME, check_same_thread=False)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    conn.row_factory = sqlite3.Row
+    _tls.conn = CachedConn(conn)
+    return _tls.conn
+
+def close_connection():
+    # closes the calling thread's connection; short-lived threads call this when they
+    # finish (a dropped reference only closes the connection whenever it is collected)
+    conn = getattr(_tls, "conn", None)
+    if conn is not None:
+        _tls.conn = None
+        conn.close()
+
+atexit.register(close_connection)
 
 # ---------------- DB init ----------------
 def init_db():
+    ensure_schema()
+    ensure_default_admin()
+
+def ensure_schema():
+    # DDL only (tables, indexes, triggers); no bcrypt work, safe to call on every start
     conn = get_connection()
     c = conn.cursor()
+    # WAL: commits append to the log instead of rewriting + fsyncing the main file
+    c.execute("PRAGMA journal_mode=WAL")
 
     c.execute('''
     CREATE TABLE IF NOT EXISTS books (
@@ -32,6 +122,18 @@ def init_db():
     )
     ''')
 
+    # full-text index over the searchable book columns, kept in sync by triggers
+    _init_books_fts(c)
+
+    if not FTS_ENABLED:
+        # all searchable text in one lower-cased column: the LIKE fallback then does one
+        # comparison per row instead of four (VIRTUAL, so it costs no storage)
+        book_cols = [r["name"] for r in c.execute("PRAGMA table_xinfo(books)").fetchall()]
+        if "search_blob" not in book_cols:
+            c.execute("ALTER TABLE books ADD COLUMN search_blob TEXT GENERATED ALWAYS AS ("
+                      "lower(coalesce(title,'') || ' ' || coalesce(author,'') || ' ' || "
+                      "coalesce(category,'') || ' ' || coalesce(isbn,''))) VIRTUAL")
+
     c.execute('''
     CREATE TABLE IF NOT EXISTS members (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -65,6 +167,7 @@ def init_db():
     c.execute("INSERT OR IGNORE INTO settings (key, value) VALUES (?, ?)", ("smtp_port", "587"))
     c.execute("INSERT OR IGNORE INTO settings (key, value) VALUES (?, ?)", ("smtp_user", ""))
     c.execute("INSERT OR IGNORE INTO settings (key, value) VALUES (?, ?)", ("smtp_password", ""))
+    c.execute("INSERT OR IGNORE INTO settings (key, value) VALUES (?, ?)", ("bcrypt_rounds", str(BCRYPT_DEFAULT_ROUNDS)))
 
     # users: add a role field (admin / staff)
     c.execute('''
@@ -87,32 +190,109 @@ def init_db():
     )
     ''')
 
+    # indexes for the hot WHERE / ORDER BY clauses (active-loan checks, date ranges, audit view)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_loans_active ON loans(book_id) WHERE date_returned IS NULL")
+    # serves ORDER BY date_borrowed DESC and date ranges, with the join keys in the leaf
+    c.execute("CREATE INDEX IF NOT EXISTS idx_loans_sort ON loans(date_borrowed DESC, book_id, member_id, date_returned)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_loans_bookid ON loans(book_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_loans_memberid ON loans(member_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_audit_created ON audit_log(created_at)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_books_title ON books(title)")
+    # expression indexes for get_member_by_login (case-insensitive email/name match)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_members_email_lower ON members(lower(email))")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_members_name_lower ON members(lower(name))")
+    # users.username already has the index behind its UNIQUE constraint
+
     conn.commit()
-    conn.close()
+    # planner statistics: the full ANALYZE scan runs only on a database that has none yet;
+    # on later starts PRAGMA optimize re-analyzes just the tables whose stats have drifted
+    if c.execute("SELECT 1 FROM sqlite_master WHERE name='sqlite_stat1'").fetchone() is None:
+        c.execute("ANALYZE")
+    else:
+        c.execute("PRAGMA optimize")
 
-    # ensure default admin
-    create_default_admin_if_missing()
+def _init_books_fts(c):
+    global FTS_ENABLED
+    fts_existed = c.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='books_fts'").fetchone() is not None
+    try:
+        c.execute("CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5("
+                  "title, author, category, isbn, content='books', content_rowid='id')")
+    except sqlite3.OperationalError:
+        # SQLite built without FTS5: list_books keeps using LIKE
+        FTS_ENABLED = False
+        return
+    c.execute('''
+    CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN
+        INSERT INTO books_fts(rowid, title, author, category, isbn)
+        VALUES (new.id, new.title, new.author, new.category, new.isbn);
+    END
+    ''')
+    c.execute('''
+    CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN
+        INSERT INTO books_fts(books_fts, rowid, title, author, category, isbn)
+        VALUES ('delete', old.id, old.title, old.author, old.category, old.isbn);
+    END
+    ''')
+    # only the indexed columns: borrow/return flip 'available' and must not touch the index
+    c.execute('''
+    CREATE TRIGGER IF NOT EXISTS books_fts_au AFTER UPDATE OF title, author, category, isbn ON books BEGIN
+        INSERT INTO books_fts(books_fts, rowid, title, author, category, isbn)
+        VALUES ('delete', old.id, old.title, old.author, old.category, old.isbn);
+        INSERT INTO books_fts(rowid, title, author, category, isbn)
+        VALUES (new.id, new.title, new.author, new.category, new.isbn);
+    END
+    ''')
+    if not fts_existed:
+        # index books that were added before the FTS table existed
+        c.execute("INSERT INTO books_fts(books_fts) VALUES ('rebuild')")
+    FTS_ENABLED = True
 
 # ---------------- users (auth) ----------------
+BCRYPT_DEFAULT_ROUNDS = 12
+
+# password changes hash (and verify) with bcrypt, ~100-300 ms each; the *_async
+# variants run on these workers so GUI callers are not blocked
+_bcrypt_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="bcrypt")
+
+_bcrypt_rounds = None
+
+def _get_bcrypt_rounds():
+    # read once from settings; set_setting("bcrypt_rounds", ...) resets it
+    global _bcrypt_rounds
+    if _bcrypt_rounds is None:
+        _bcrypt_rounds = get_setting_int("bcrypt_rounds", BCRYPT_DEFAULT_ROUNDS)
+    return _bcrypt_rounds
+
+def _hash_password(password_plain):
+    return bcrypt.hashpw(password_plain.encode("utf-8"), bcrypt.gensalt(_get_bcrypt_rounds()))
+
+_dummy_hash = None  # (rounds, hash) compared against on unknown usernames
+
+def _get_dummy_hash():
+    global _dummy_hash
+    rounds = _get_bcrypt_rounds()
+    if _dummy_hash is None or _dummy_hash[0] != rounds:
+        _dummy_hash = (rounds, bcrypt.hashpw(b"dummy-password", bcrypt.gensalt(rounds)))
+    return _dummy_hash[1]
+
 def create_user(username, password_plain, role="admin"):
-    password_bytes = password_plain.encode("utf-8")
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password_bytes, salt)
+    hashed = _hash_password(password_plain)
     conn = get_connection()
-    c = conn.cursor()
-    c.execute("INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)",
-              (username, hashed, role))
+    conn.execute("INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)",
+                 (username, hashed, role))
     conn.commit()
-    conn.close()
     log_audit(username, "create_user", f"created user '{username}' with role '{role}'")
 
 def verify_user(username, password_plain):
+    # built up front so the first unknown-username attempt is not slower than the rest;
+    # every stored hash (the default admin's included) uses the same configured cost
+    dummy_hash = _get_dummy_hash()
     conn = get_connection()
-    c = conn.cursor()
-    c.execute("SELECT * FROM users WHERE username=?", (username,))
+    c = conn.execute("SELECT password_hash FROM users WHERE username=?", (username,))
     row = c.fetchone()
-    conn.close()
     if not row:
+        # same bcrypt work as a real check, so response time does not reveal valid usernames
+        bcrypt.checkpw(password_plain.encode("utf-8"), dummy_hash)
         return False
     hashed = row["password_hash"]
     try:
@@ -122,11 +302,18 @@ def verify_user(username, password_plain):
 
 def any_user_exists():
     conn = get_connection()
-    c = conn.cursor()
-    c.execute("SELECT COUNT(*) AS cnt FROM users")
-    r = c.fetchone()
-    conn.close()
-    return r["cnt"] > 0
+    c = conn.execute("SELECT 1 FROM users LIMIT 1")
+    return c.fetchone() is not None
+
+_admin_checked = False
+
+def ensure_default_admin():
+    # creating the placeholder admin costs a bcrypt hash, so callers defer this to the
+    # first login; after one check per process it is a no-op
+    global _admin_checked
+    if not _admin_checked:
+        create_default_admin_if_missing()
+        _admin_checked = True
 
 def create_default_admin_if_missing():
     if not any_user_exists():
@@ -136,169 +323,167 @@ def create_default_admin_if_missing():
 def change_user_password(username, old_password_plain, new_password_plain):
     if not verify_user(username, old_password_plain):
         return {"success": False, "message": "Current password incorrect."}
-    password_bytes = new_password_plain.encode("utf-8")
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password_bytes, salt)
+    hashed = _hash_password(new_password_plain)
     conn = get_connection()
-    c = conn.cursor()
-    c.execute("UPDATE users SET password_hash=? WHERE username=?", (hashed, username))
+    conn.execute("UPDATE users SET password_hash=? WHERE username=?", (hashed, username))
     conn.commit()
-    conn.close()
     log_audit(username, "change_password", f"user '{username}' changed their password")
     return {"success": True, "message": "Password changed."}
 
+def change_user_password_async(username, old_password_plain, new_password_plain):
+    # returns a Future resolving to change_user_password's result dict
+    return _bcrypt_pool.submit(change_user_password, username, old_password_plain, new_password_plain)
+
 def admin_reset_password(admin_username, target_username, new_password_plain):
     # admin resets another user's password
-    password_bytes = new_password_plain.encode("utf-8")
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password_bytes, salt)
+    hashed = _hash_password(new_password_plain)
     conn = get_connection()
-    c = conn.cursor()
-    c.execute("UPDATE users SET password_hash=? WHERE username=?", (hashed, target_username))
+    conn.execute("UPDATE users SET password_hash=? WHERE username=?", (hashed, target_username))
     conn.commit()
-    conn.close()
     log_audit(admin_username, "admin_reset_password", f"admin '{admin_username}' reset password for '{target_username}'")
     return {"success": True, "message": f"Password for {target_username} reset."}
 
+def admin_reset_password_async(admin_username, target_username, new_password_plain):
+    # returns a Future resolving to admin_reset_password's result dict
+    return _bcrypt_pool.submit(admin_reset_password, admin_username, target_username, new_password_plain)
+
 def get_user_role(username):
     conn = get_connection()
-    c = conn.cursor()
-    c.execute("SELECT role FROM users WHERE username=?", (username,))
+    c = conn.execute("SELECT role FROM users WHERE username=?", (username,))
     r = c.fetchone()
-    conn.close()
     return r["role"] if r else None
 
 def list_users():
     conn = get_connection()
-    c = conn.cursor()
-    c.execute("SELECT id, username, role FROM users ORDER BY username")
+    c = conn.execute("SELECT id, username, role FROM users ORDER BY username")
     rows = c.fetchall()
-    conn.close()
     return rows
 
 # ---------------- books / members / loans ----------------
 def add_book(title, author, category=None, isbn=None, actor=None):
     conn = get_connection()
-    c = conn.cursor()
-    c.execute("INSERT INTO books (title, author, category, isbn, available) VALUES (?, ?, ?, ?, 1)",
-              (title, author, category, isbn))
+    conn.execute("INSERT INTO books (title, author, category, isbn, available) VALUES (?, ?, ?, ?, 1)",
+                 (title, author, category, isbn))
     conn.commit()
-    conn.close()
     log_audit(actor or "unknown", "add_book", title)
 
 def update_book(book_id, title, author, category, isbn, available=True, actor=None):
     conn = get_connection()
-    c = conn.cursor()
-    c.execute("UPDATE books SET title=?, author=?, category=?, isbn=?, available=? WHERE id=?",
-              (title, author, category, isbn, 1 if available else 0, book_id))
+    conn.execute("UPDATE books SET title=?, author=?, category=?, isbn=?, available=? WHERE id=?",
+                 (title, author, category, isbn, 1 if available else 0, book_id))
     conn.commit()
-    conn.close()
     log_audit(actor or "unknown", "update_book", f"{book_id} -> {title}")
 
 def delete_book(book_id, actor=None):
     conn = get_connection()
-    c = conn.cursor()
-    c.execute("SELECT COUNT(*) AS cnt FROM loans WHERE book_id=? AND date_returned IS NULL", (book_id,))
-    row = c.fetchone()
-    if row and row["cnt"] > 0:
-        conn.close()
+    c = conn.execute("SELECT 1 FROM loans WHERE book_id=? AND date_returned IS NULL LIMIT 1", (book_id,))
+    if c.fetchone() is not None:
         return {"success": False, "message": "Cannot delete: book has active (not returned) loans."}
     # get title for audit
-    c.execute("SELECT title FROM books WHERE id=?", (book_id,))
+    c = conn.execute("SELECT title FROM books WHERE id=?", (book_id,))
     b = c.fetchone()
     title = b["title"] if b else f"id:{book_id}"
-    c.execute("DELETE FROM books WHERE id=?", (book_id,))
+    conn.execute("DELETE FROM books WHERE id=?", (book_id,))
     conn.commit()
-    conn.close()
     log_audit(actor or "unknown", "delete_book", title)
     return {"success": True, "message": "Book deleted."}
 
 def get_book(book_id):
     conn = get_connection()
-    c = conn.cursor()
-    c.execute("SELECT * FROM books WHERE id=?", (book_id,))
+    c = conn.execute("SELECT id, title, author, category, isbn, available FROM books WHERE id=?", (book_id,))
     book = c.fetchone()
-    conn.close()
     return book
 
-def list_books(search=None):
+def _fts_query(text):
+    # every whitespace-separated term becomes a quoted prefix match; terms are ANDed
+    terms = [t.replace('"', '""') for t in text.split()]
+    return " ".join(f'"{t}"*' for t in terms)
+
+def list_books(search=None, limit=None, offset=0):
     conn = get_connection()
-    c = conn.cursor()
-    if search:
-        q = f"%{search}%"
-        c.execute("SELECT * FROM books WHERE title LIKE ? OR author LIKE ? OR category LIKE ? OR isbn LIKE ? ORDER BY title",
-                  (q, q, q, q))
+    fts_query = _fts_query(search) if search and FTS_ENABLED else ""
+    # id breaks title ties so LIMIT/OFFSET pages are stable
+    if fts_query:
+        # the FTS index resolves the matching rowids; books is then read by primary key
+        query = ("SELECT id, title, author, category, isbn, available FROM books "
+                 "WHERE id IN (SELECT rowid FROM books_fts WHERE books_fts MATCH ?) ORDER BY title, id")
+        params = [fts_query]
+    elif search and not FTS_ENABLED:
+        # search_blob only exists on this path (see ensure_schema); with FTS, a search of
+        # only whitespace has no terms and lists every book
+        query = "SELECT id, title, author, category, isbn, available FROM books WHERE search_blob LIKE ? ORDER BY title, id"
+        params = [f"%{search.lower()}%"]
     else:
-        c.execute("SELECT * FROM books ORDER BY title")
+        query = "SELECT id, title, author, category, isbn, available FROM books ORDER BY title, id"
+        params = []
+    if limit:
+        query += " LIMIT ? OFFSET ?"
+        params += [limit, offset]
+    c = conn.execute(query, params)
     rows = c.fetchall()
-    conn.close()
     return rows
 
 def add_member(name, email=None, actor=None):
     conn = get_connection()
-    c = conn.cursor()
-    c.execute("INSERT INTO members (name, email) VALUES (?, ?)", (name, email))
+    conn.execute("INSERT INTO members (name, email) VALUES (?, ?)", (name, email))
     conn.commit()
-    conn.close()
     log_audit(actor or "unknown", "add_member", name)
 
 def list_members():
     conn = get_connection()
-    c = conn.cursor()
-    c.execute("SELECT * FROM members ORDER BY name")
+    c = conn.execute("SELECT id, name, email FROM members ORDER BY name")
     rows = c.fetchall()
-    conn.close()
     return rows
 
 def get_member(member_id):
     conn = get_connection()
-    c = conn.cursor()
-    c.execute("SELECT * FROM members WHERE id=?", (member_id,))
+    c = conn.execute("SELECT id, name, email FROM members WHERE id=?", (member_id,))
+    m = c.fetchone()
+    return m
+
+def get_member_by_login(username):
+    # maps a login name to a library member by email or name, case-insensitively
+    conn = get_connection()
+    u = (username or "").lower()
+    c = conn.execute("SELECT id, name, email FROM members WHERE lower(email)=? OR lower(name)=? ORDER BY name LIMIT 1",
+                     (u, u))
     m = c.fetchone()
-    conn.close()
     return m
 
 def search_members_by_text(text):
     conn = get_connection()
-    c = conn.cursor()
     q = f"%{text}%"
-    c.execute("SELECT * FROM members WHERE name LIKE ? OR email LIKE ? ORDER BY name LIMIT 200", (q, q))
-    rows = c.fetchall()
-    conn.close()
-    return rows
+    c = conn.execute("SELECT id, name, email FROM members WHERE name LIKE ? OR email LIKE ? ORDER BY name LIMIT 200", (q, q))
+    # feeds SearchableDropdown, which works on plain dicts
+    return rows_as_dicts(c.fetchall())
 
 # ---------------- loans ----------------
 def borrow_book(book_id, member_id, days_due=14, actor=None):
     conn = get_connection()
-    c = conn.cursor()
-    c.execute("SELECT available FROM books WHERE id=?", (book_id,))
-    b = c.fetchone()
-    if not b:
-        conn.close()
-        return {"success": False, "message": "Book not found."}
-    if b["available"] == 0:
-        conn.close()
-        return {"success": False, "message": "Book currently not available."}
     now = datetime.now()
     due = now + timedelta(days=days_due)
-    c.execute("INSERT INTO loans (book_id, member_id, date_borrowed, date_due) VALUES (?, ?, ?, ?)",
-              (book_id, member_id, now.isoformat(), due.isoformat()))
-    c.execute("UPDATE books SET available=0 WHERE id=?", (book_id,))
-    conn.commit()
-    conn.close()
+    with conn:
+        # claim the book and record the loan in one transaction; the guarded UPDATE
+        # doubles as the availability check
+        c = conn.execute("UPDATE books SET available=0 WHERE id=? AND available=1", (book_id,))
+        if c.rowcount == 1:
+            conn.execute("INSERT INTO loans (book_id, member_id, date_borrowed, date_due) VALUES (?, ?, ?, ?)",
+                         (book_id, member_id, now.isoformat(), due.isoformat()))
+    if c.rowcount != 1:
+        c = conn.execute("SELECT 1 FROM books WHERE id=?", (book_id,))
+        if c.fetchone() is None:
+            return {"success": False, "message": "Book not found."}
+        return {"success": False, "message": "Book currently not available."}
     log_audit(actor or "unknown", "borrow_book", f"book:{book_id} member:{member_id} due:{due.date()}")
     return {"success": True, "message": f"Borrowed successfully; due on {due.date()}"}
 
 def return_book(loan_id, actor=None):
     conn = get_connection()
-    c = conn.cursor()
-    c.execute("SELECT * FROM loans WHERE id=?", (loan_id,))
+    c = conn.execute("SELECT book_id, date_due, date_returned FROM loans WHERE id=?", (loan_id,))
     loan = c.fetchone()
     if not loan:
-        conn.close()
         return {"success": False, "message": "Loan not found."}
     if loan["date_returned"]:
-        conn.close()
         return {"success": False, "message": "Already returned."}
     late_fee_setting = get_setting("late_fee_per_day")
     try:
@@ -311,20 +496,20 @@ def return_book(loan_id, actor=None):
     late_fee = 0.0
     if late_days > 0:
         late_fee = late_days * late_fee_per_day
-    c.execute("UPDATE loans SET date_returned=?, late_fee=? WHERE id=?",
-              (date_returned.isoformat(), late_fee, loan_id))
-    c.execute("UPDATE books SET available=1 WHERE id=?", (loan["book_id"],))
-    conn.commit()
-    conn.close()
+    with conn:
+        conn.execute("UPDATE loans SET date_returned=?, late_fee=? WHERE id=?",
+                     (date_returned.isoformat(), late_fee, loan_id))
+        conn.execute("UPDATE books SET available=1 WHERE id=?", (loan["book_id"],))
     log_audit(actor or "unknown", "return_book", f"loan:{loan_id} late_fee:{late_fee}")
     return {"success": True, "message": f"Returned. Late fee: {late_fee:.2f}", "late_fee": late_fee}
 
 def list_loans(show_all=True):
     conn = get_connection()
-    c = conn.cursor()
     query = """
     SELECT loans.id as loan_id, loans.book_id, loans.member_id,
            loans.date_borrowed, loans.date_due, loans.date_returned, loans.late_fee,
+           strftime('%Y-%m-%d', loans.date_borrowed) as borrowed_day,
+           strftime('%Y-%m-%d', loans.date_due) as due_day,
            books.title as book_title, members.name as member_name
     FROM loans
     JOIN books ON loans.book_id = books.id
@@ -333,84 +518,193 @@ def list_loans(show_all=True):
     if not show_all:
         query += " WHERE loans.date_returned IS NULL"
     query += " ORDER BY loans.date_borrowed DESC"
-    c.execute(query)
+    c = conn.execute(query)
     rows = c.fetchall()
-    conn.close()
     return rows
 
-def get_all_loans_for_export():
+def member_loan_counts(member_id):
+    # (borrowed, returned) totals for one member, counted in SQL
     conn = get_connection()
-    c = conn.cursor()
-    c.execute("""
+    c = conn.execute("SELECT COUNT(*), COALESCE(SUM(date_returned IS NOT NULL), 0) FROM loans WHERE member_id=?",
+                     (member_id,))
+    borrowed, returned = c.fetchone()
+    return borrowed, returned
+
+_EXPORT_LOANS_SQL = """
     SELECT loans.id as loan_id, books.title as book_title, members.name as member_name,
            loans.date_borrowed, loans.date_due, loans.date_returned, loans.late_fee
     FROM loans
     JOIN books ON loans.book_id = books.id
     JOIN members ON loans.member_id = members.id
-    ORDER BY loans.date_borrowed DESC
-    """)
+    """
+
+def _export_loans_query(date_from=None, date_to=None):
+    # optional inclusive bounds on date_borrowed as ISO 8601 strings, served by
+    # idx_loans_sort; stored timestamps are ISO strings too, so the plain string
+    # comparison is chronological and nothing is parsed per row
+    query = _EXPORT_LOANS_SQL
+    where = []
+    params = []
+    if date_from:
+        where.append("loans.date_borrowed >= ?")
+        params.append(date_from)
+    if date_to:
+        where.append("loans.date_borrowed <= ?")
+        params.append(date_to)
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    query += " ORDER BY loans.date_borrowed DESC"
+    return query, params
+
+def get_all_loans_for_export():
+    return get_loans_for_export()
+
+def get_loans_for_export(date_from=None, date_to=None):
+    conn = get_connection()
+    c = conn.execute(*_export_loans_query(date_from, date_to))
     rows = c.fetchall()
-    conn.close()
     return rows
 
+EXPORT_BATCH_SIZE = 10000
+
+def iter_loan_batches_for_export(date_from=None, date_to=None, batch_size=EXPORT_BATCH_SIZE):
+    # streams rows as fetchmany() lists instead of materializing the whole result
+    # (exports can be large); a dedicated cursor, so other queries can run while
+    # the caller iterates
+    cur = get_connection().cursor()
+    cur.execute(*_export_loans_query(date_from, date_to))
+    while True:
+        batch = cur.fetchmany(batch_size)
+        if not batch:
+            break
+        yield batch
+
 # ---------------- settings ----------------
 def get_setting(key):
     conn = get_connection()
-    c = conn.cursor()
-    c.execute("SELECT value FROM settings WHERE key=?", (key,))
+    c = conn.execute("SELECT value FROM settings WHERE key=?", (key,))
     row = c.fetchone()
-    conn.close()
     return row["value"] if row else None
 
+def get_setting_int(key, default):
+    try:
+        return int(get_setting(key))
+    except (TypeError, ValueError):
+        return default
+
+def get_settings(keys):
+    # several settings in one query; keys missing from the table are absent from the dict
+    keys = list(keys)
+    if not keys:
+        return {}
+    conn = get_connection()
+    c = conn.execute(f"SELECT key, value FROM settings WHERE key IN ({','.join('?' * len(keys))})", keys)
+    return {r["key"]: r["value"] for r in c.fetchall()}
+
+SMTP_KEYS = ("smtp_host", "smtp_port", "smtp_user", "smtp_password")
+
+# smtp_* settings are read on every mail send; keep them for SMTP_CACHE_TTL seconds
+SMTP_CACHE_TTL = 30.0
+
+_smtp_cache = {"value": None, "expires": 0.0}
+
+def get_smtp_settings():
+    now = time.monotonic()
+    if _smtp_cache["value"] is None or now >= _smtp_cache["expires"]:
+        _smtp_cache["value"] = get_settings(SMTP_KEYS)
+        _smtp_cache["expires"] = now + SMTP_CACHE_TTL
+    return dict(_smtp_cache["value"])
+
 def set_setting(key, value, actor=None):
+    global _bcrypt_rounds
     conn = get_connection()
-    c = conn.cursor()
-    c.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, str(value)))
+    conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, str(value)))
     conn.commit()
-    conn.close()
+    if key.startswith("smtp_"):
+        _smtp_cache["value"] = None
+    elif key == "bcrypt_rounds":
+        _bcrypt_rounds = None
     log_audit(actor or "unknown", "set_setting", f"{key}={value}")
 
 # ---------------- audit ----------------
+# audit rows are buffered and written in batches: when AUDIT_FLUSH_SIZE rows are
+# pending, AUDIT_FLUSH_DELAY seconds after the first buffered row, or at exit
+AUDIT_FLUSH_SIZE = 64
+AUDIT_FLUSH_DELAY = 0.25
+
+_audit_buf = deque()
+_audit_lock = threading.Lock()
+_audit_flush_pending = False
+# delayed flushes run on one long-lived worker, so they share one connection
+_audit_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="audit")
+
+def _now_iso():
+    # local time like the rest of the stored timestamps, second precision
+    return time.strftime("%Y-%m-%dT%H:%M:%S")
+
 def log_audit(actor, action, details):
-    conn = get_connection()
-    c = conn.cursor()
-    now = datetime.now().isoformat()
-    c.execute("INSERT INTO audit_log (actor, action, details, created_at) VALUES (?, ?, ?, ?)",
-              (actor, action, details, now))
-    conn.commit()
-    conn.close()
+    global _audit_flush_pending
+    now = _now_iso()
+    with _audit_lock:
+        _audit_buf.append((actor, action, details, now))
+        full = len(_audit_buf) >= AUDIT_FLUSH_SIZE
+        if not full and not _audit_flush_pending:
+            _audit_flush_pending = True
+            _audit_pool.submit(_flush_audit_later)
+    if full:
+        flush_audit()
+
+def _flush_audit_later():
+    global _audit_flush_pending
+    time.sleep(AUDIT_FLUSH_DELAY)
+    with _audit_lock:
+        _audit_flush_pending = False
+    try:
+        flush_audit()
+    except sqlite3.Error as e:
+        # the rows stay buffered; the next log_audit, query_audit or exit retries them
+        print(f"audit: flush failed, will retry: {e}")
+
+def flush_audit():
+    # the lock is held until the INSERT has committed, so a concurrent query_audit waits
+    # for the rows instead of missing them; if the write fails they stay in the buffer
+    with _audit_lock:
+        if not _audit_buf:
+            return
+        conn = get_connection()
+        with conn:
+            conn.executemany("INSERT INTO audit_log (actor, action, details, created_at) VALUES (?, ?, ?, ?)", list(_audit_buf))
+        _audit_buf.clear()
+
+# registered after close_connection, so it runs first at exit
+atexit.register(flush_audit)
 
 def query_audit(limit=200, since=None):
+    flush_audit()
     conn = get_connection()
-    c = conn.cursor()
     if since:
-        c.execute("SELECT * FROM audit_log WHERE created_at>=? ORDER BY created_at DESC LIMIT ?", (since.isoformat(), limit))
+        c = conn.execute("SELECT * FROM audit_log WHERE created_at>=? ORDER BY created_at DESC, id DESC LIMIT ?", (since.isoformat(), limit))
     else:
-        c.execute("SELECT * FROM audit_log ORDER BY created_at DESC LIMIT ?", (limit,))
+        c = conn.execute("SELECT * FROM audit_log ORDER BY created_at DESC, id DESC LIMIT ?", (limit,))
     rows = c.fetchall()
-    conn.close()
     return rows
 
 # ---------------- analytics helpers ----------------
 def analytics_totals():
     conn = get_connection()
-    c = conn.cursor()
-    c.execute("SELECT COUNT(*) AS cnt FROM books")
+    c = conn.execute("SELECT COUNT(*) AS cnt FROM books")
     books = c.fetchone()["cnt"]
-    c.execute("SELECT COUNT(*) AS cnt FROM members")
+    c = conn.execute("SELECT COUNT(*) AS cnt FROM members")
     members = c.fetchone()["cnt"]
-    c.execute("SELECT COUNT(*) AS cnt FROM loans WHERE date_returned IS NULL")
+    c = conn.execute("SELECT COUNT(*) AS cnt FROM loans WHERE date_returned IS NULL")
     active_loans = c.fetchone()["cnt"]
-    conn.close()
     return {"books": books, "members": members, "active_loans": active_loans}
 
 def analytics_loans_by_month(months=6):
     # returns list of tuples (YYYY-MM, count) for the last N months
-    from datetime import date
-    conn = get_connection()
-    c = conn.cursor()
     today = datetime.now().date()
-    results = []
+    # year-month pairs, oldest first
+    ym_list = []
     for i in range(months-1, -1, -1):
         # compute year-month for i months ago
         y = today.year
@@ -418,13 +712,15 @@ def analytics_loans_by_month(months=6):
         while m <= 0:
             y -= 1
             m += 12
-        start = datetime(y, m, 1)
-        if m == 12:
-            end = datetime(y+1, 1, 1)
-        else:
-            end = datetime(y, m+1, 1)
-        c.execute("SELECT COUNT(*) AS cnt FROM loans WHERE date_borrowed >= ? AND date_borrowed < ?", (start.isoformat(), end.isoformat()))
-        cnt = c.fetchone()["cnt"]
-        results.append((f"{y}-{m:02d}", cnt))
-    conn.close()
+        ym_list.append((y, m))
+    y0, m0 = ym_list[0]
+    start = datetime(y0, m0, 1)
+    conn = get_connection()
+    c = conn.execute("SELECT strftime('%Y-%m', date_borrowed) AS ym, COUNT(*) AS cnt FROM loans "
+                     "WHERE date_borrowed >= ? GROUP BY ym", (start.isoformat(),))
+    counts = {r["ym"]: r["cnt"] for r in c.fetchall()}
+    results = []
+    for y, m in ym_list:
+        ym = f"{y}-{m:02d}"
+        results.append((ym, counts.get(ym, 0)))
     return results
@@ -11,56 +11,97 @@ Security notes:
 
 import smtplib
 import ssl
+from concurrent.futures import ThreadPoolExecutor
 from email.message import EmailMessage
 import database
 
+# one background worker so queued batches go out in order without blocking the caller
+_mail_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mailer")
+
 def _get_smtp_config():
-    host = database.get_setting("smtp_host") or ""
-    port = int(database.get_setting("smtp_port") or 0) if database.get_setting("smtp_port") else None
-    user = database.get_setting("smtp_user") or ""
-    password = database.get_setting("smtp_password") or ""
+    # one query, cached briefly by database.get_smtp_settings
+    s = database.get_smtp_settings()
+    host = s.get("smtp_host") or ""
+    port = int(s["smtp_port"]) if s.get("smtp_port") else None
+    user = s.get("smtp_user") or ""
+    password = s.get("smtp_password") or ""
     return {"host": host, "port": port, "user": user, "password": password}
 
-def send_email(to_address, subject, body, from_address=None):
-    cfg = _get_smtp_config()
-    if not (cfg["host"] and cfg["port"] and cfg["user"] and cfg["password"]):
-        # SMTP not configured — do nothing (avoid raising in UI)
-        print("mailer: SMTP not configured, skipping actual send. To enable, set smtp_host/smtp_port/smtp_user/smtp_password in settings.")
-        return {"success": False, "message": "SMTP not configured"}
-
+def _build_message(to_address, subject, body, from_address):
     msg = EmailMessage()
     msg["Subject"] = subject
-    msg["From"] = from_address or cfg["user"]
+    msg["From"] = from_address
     msg["To"] = to_address
     msg.set_content(body)
+    return msg
 
+def send_emails(messages, from_address=None):
+    """
+    Send a list of (to_address, subject, body) tuples over a single SMTP session
+    (one connect + STARTTLS + login for the whole batch).
+    Returns one result dict per message, in the same order.
+    """
+    try:
+        cfg = _get_smtp_config()
+    except ValueError as e:
+        # a non-numeric smtp_port in the table; report it like any other send failure
+        return [{"success": False, "message": f"Invalid SMTP settings: {e}"} for _ in messages]
+    if not (cfg["host"] and cfg["port"] and cfg["user"] and cfg["password"]):
+        # SMTP not configured — do nothing (avoid raising in UI)
+        print("mailer: SMTP not configured, skipping actual send. To enable, set smtp_host/smtp_port/smtp_user/smtp_password in settings.")
+        return [{"success": False, "message": "SMTP not configured"} for _ in messages]
+
+    results = []
     context = ssl.create_default_context()
     try:
         with smtplib.SMTP(cfg["host"], cfg["port"], timeout=10) as server:
             server.starttls(context=context)
             server.login(cfg["user"], cfg["password"])
-            server.send_message(msg)
-        return {"success": True}
+            for to_address, subject, body in messages:
+                msg = _build_message(to_address, subject, body, from_address or cfg["user"])
+                try:
+                    server.send_message(msg)
+                    results.append({"success": True})
+                except Exception as e:
+                    results.append({"success": False, "message": str(e)})
     except Exception as e:
-        # do not propagate to UI — return error for logging
-        return {"success": False, "message": str(e)}
+        # do not propagate to UI — connect/login failed: report it for every unsent message
+        results.extend({"success": False, "message": str(e)} for _ in messages[len(results):])
+    return results
 
-def send_password_change_email(username, to_email):
-    if not to_email:
-        return {"success": False, "message": "No recipient email"}
+def send_emails_async(messages, from_address=None):
+    # returns a Future resolving to send_emails' result list; send_emails reports every
+    # failure in its results, so the Future itself does not raise
+    return _mail_pool.submit(send_emails, list(messages), from_address)
+
+def send_email(to_address, subject, body, from_address=None):
+    return send_emails([(to_address, subject, body)], from_address)[0]
+
+# the notification builders return (to_address, subject, body) tuples, so they can be
+# queued with send_emails_async as well as sent directly
+
+def password_change_message(username, to_email):
     subject = "Your library account password was changed"
     body = (f"Hello {username},\n\n"
             "This is a confirmation that your password was recently changed.\n\n"
             "If you did not request this change, please contact your library admin immediately.\n\n"
             "Regards,\nLibrary System")
-    return send_email(to_email, subject, body)
+    return (to_email, subject, body)
 
-def send_admin_reset_email(admin_username, target_username, to_email):
-    if not to_email:
-        return {"success": False, "message": "No recipient email"}
+def admin_reset_message(admin_username, target_username, to_email):
     subject = "Your library account password has been reset by admin"
     body = (f"Hello {target_username},\n\n"
             f"Your password was reset by administrator '{admin_username}'.\n"
             "If you did not expect this, please contact your admin and change your password after logging in.\n\n"
             "Regards,\nLibrary System")
-    return send_email(to_email, subject, body)
+    return (to_email, subject, body)
+
+def send_password_change_email(username, to_email):
+    if not to_email:
+        return {"success": False, "message": "No recipient email"}
+    return send_email(*password_change_message(username, to_email))
+
+def send_admin_reset_email(admin_username, target_username, to_email):
+    if not to_email:
+        return {"success": False, "message": "No recipient email"}
+    return send_email(*admin_reset_message(admin_username, target_username, to_email))
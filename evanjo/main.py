@@ -13,8 +13,10 @@ Features:
 - Export transactions with date-range filters (file picker, CSV/XLSX)
 """
 
-import os
 import threading
+import time
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 import tkinter as tk
 from tkinter import ttk, messagebox, Toplevel, filedialog
 import customtkinter as ctk
@@ -22,6 +24,7 @@ from datetime import datetime
 import re
 import csv
 import openpyxl
+import xlsxwriter
 import platform
 
 # charts
@@ -37,7 +40,12 @@ import mailer
 # ---------------------------
 # App initialization / theme
 # ---------------------------
-database.init_db()
+# schema only; the default admin account is created lazily on the first login attempt
+database.ensure_schema()
+
+# UI-triggered reads/writes run here instead of on the Tk thread; one worker keeps
+# them in submission order and reuses a single thread-local connection
+_db_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ui-db")
 
 PALETTE = {
     "bg": "#f0f6ff",      # soft sky
@@ -57,10 +65,52 @@ EMAIL_RE = re.compile(r"^[\w\.-]+@[\w\.-]+\.\w+$")
 def is_valid_email(email):
     return EMAIL_RE.match(email) is not None
 
+# rows fetched per page in the Search Books tree
+SEARCH_PAGE_SIZE = 200
+
+# column options shared by every Treeview built by LibraryApp.make_tree
+_DEFAULT_COL = {"width": 120, "anchor": "w"}
+
+# rows inserted at a time into the transactions and audit trees
+LAZY_CHUNK = 200
+
+# typing pause before the Search Books tree refreshes on its own
+SEARCH_DEBOUNCE_MS = 250
+
+# seconds a dashboard aggregate is reused before it is queried again
+ANALYTICS_TTL = 15.0
+
+# settings shown on the Settings page, read in one query
+SETTINGS_KEYS = ("late_fee_per_day",) + database.SMTP_KEYS
+
+def book_values(r):
+    # Treeview values for a books row (search and borrow trees share the columns)
+    return (r["id"], r["title"], r["author"] or "", r["category"] or "", r["isbn"] or "", "Yes" if r["available"] else "No")
+
+def loan_values(r):
+    # transactions tree / CSV / XLSX row for an export loans row; stored timestamps are
+    # ISO 8601 strings, so the date is just the first 10 characters (nothing is parsed,
+    # and a loan still out has date_returned None)
+    return (r["loan_id"], r["book_title"], r["member_name"], r["date_borrowed"][:10], r["date_due"][:10],
+            (r["date_returned"] or "")[:10], r["late_fee"])
+
 # ---------------------------
 # SearchableDropdown widget
 # ---------------------------
-from difflib import SequenceMatcher
+try:
+    # C++ fuzzy matching; optional — SearchableDropdown falls back to bigram overlap without it
+    from rapidfuzz import process as rf_process, fuzz as rf_fuzz
+except ImportError:
+    rf_process = rf_fuzz = None
+
+def bigrams(s):
+    # set of character bigrams; a one-character string is its own single gram
+    return {s[i:i+2] for i in range(len(s) - 1)} or {s}
+
+def bigram_jaccard(a, b):
+    # similarity of two bigram sets, 0..1
+    union = len(a | b)
+    return len(a & b) / union if union else 0.0
 
 class SearchableDropdown:
     """
@@ -72,10 +122,13 @@ class SearchableDropdown:
       - on_select(dict) callback
 
     Behavior:
-      - fuzzy sorts results with difflib.SequenceMatcher
+      - fuzzy sorts results with rapidfuzz WRatio (bigram Jaccard similarity if rapidfuzz is missing)
       - Up/Down/Enter/Escape keyboard support
       - Colors stronger matches using PALETTE
     """
+    # quiet period after the last keystroke before the list is re-queried
+    DEBOUNCE_MS = 140
+
     def __init__(self, parent, fetch_fn, on_select, title="Select item", max_results=200):
         self.parent = parent
         self.fetch_fn = fetch_fn
@@ -94,8 +147,7 @@ class SearchableDropdown:
         tk.Label(top, text=title, anchor="w", bg=PALETTE["panel"],
                  fg=PALETTE["accent"], font=("Helvetica", 12, "bold")).pack(fill="x")
 
-        self.entry_var = tk.StringVar()
-        self.entry = tk.Entry(top, textvariable=self.entry_var, font=("Segoe UI", 11))
+        self.entry = tk.Entry(top, font=("Segoe UI", 11))
         self.entry.pack(fill="x", pady=(6,4))
         self.entry.focus_set()
 
@@ -110,7 +162,9 @@ class SearchableDropdown:
         lb_frame = tk.Frame(self.win, bg=PALETTE["panel"])
         lb_frame.pack(fill="both", expand=True, padx=12, pady=(6,12))
 
-        self.listbox = tk.Listbox(lb_frame, activestyle="none", selectmode="browse", font=("Segoe UI", 10))
+        # weak matches use the listbox default colour; update_list only recolours strong ones
+        self.listbox = tk.Listbox(lb_frame, activestyle="none", selectmode="browse", font=("Segoe UI", 10),
+                                  fg=PALETTE["muted"])
         self.listbox.pack(side="left", fill="both", expand=True)
         self.listbox.bind("<Double-Button-1>", lambda e: self.confirm_selection())
         self.listbox.bind("<Return>", lambda e: self.confirm_selection())
@@ -131,11 +185,18 @@ class SearchableDropdown:
         cancel.pack(side="right", padx=(6,0))
 
         self.results = []
+        self._pending_after = None
+        self._pending_text = ""
+        self._last_text = None
+        # lower-cased "name email" and display label per row id, rebuilt only when
+        # fetch_fn returns a different row set
+        self._hay_key = None
+        self._hay_cache = {}
+        self._label_cache = {}
+        # bigram sets of the haystacks, filled on demand by the non-rapidfuzz path
+        self._gram_cache = {}
         self.update_list("")
 
-    def fuzzy_score(self, needle, haystack):
-        return SequenceMatcher(None, needle.lower(), haystack.lower()).ratio()
-
     def format_label(self, r):
         email = r.get("email","")
         if email:
@@ -144,31 +205,58 @@ class SearchableDropdown:
 
     def update_list(self, txt):
         txt = txt or ""
+        self._last_text = txt
         rows = self.fetch_fn(txt) if txt is not None else self.fetch_fn("")
-        scored = []
-        for r in rows:
-            hay = f"{r.get('name','')} {r.get('email','')}"
-            score = self.fuzzy_score(txt, hay) if txt else 0.5
-            scored.append((score, r))
-        scored.sort(key=lambda x: (-x[0], x[1].get("name","")))
-        scored = scored[:self.max_results]
+        key = tuple(r["id"] for r in rows)
+        if key != self._hay_key:
+            self._hay_key = key
+            self._hay_cache = {r["id"]: f"{r.get('name') or ''} {r.get('email') or ''}".lower() for r in rows}
+            self._label_cache = {r["id"]: self.format_label(r) for r in rows}
+            self._gram_cache = {}
+        hays = self._hay_cache
+        needle = txt.lower()
+        if txt and rf_process is not None:
+            # extract() scores, filters and sorts in one C++ pass; scores are 0-100.
+            # Haystacks and needle are already lower-cased, so skip rapidfuzz's own processing.
+            by_id = {r["id"]: r for r in rows}
+            matches = rf_process.extract(needle, hays, scorer=rf_fuzz.WRatio, processor=None,
+                                         limit=self.max_results, score_cutoff=30)
+            scored = [(score / 100.0, by_id[key]) for _, score, key in matches]
+        else:
+            scored = []
+            needle_grams = bigrams(needle)
+            grams = self._gram_cache
+            for r in rows:
+                if txt:
+                    g = grams.get(r["id"])
+                    if g is None:
+                        g = grams[r["id"]] = bigrams(hays[r["id"]])
+                    score = bigram_jaccard(needle_grams, g)
+                else:
+                    score = 0.5
+                scored.append((score, r))
+            scored.sort(key=lambda x: (-x[0], x[1].get("name","")))
+            scored = scored[:self.max_results]
 
         self.results = [r for _, r in scored]
+        label_of = self._label_cache
+        labels = [label_of[r["id"]] for r in self.results]
         self.listbox.delete(0, tk.END)
-        for idx, r in enumerate(self.results):
-            label = self.format_label(r)
-            self.listbox.insert(tk.END, label)
+        # one Tcl call for the whole list instead of one insert per row
+        self.listbox.insert(tk.END, *labels)
+        # scored is sorted best-first, so the highlighted rows are a prefix of the list
+        for idx, (score, _) in enumerate(scored):
+            if score > 0.8:
+                fg = PALETTE["accent"]
+            elif score > 0.6:
+                fg = PALETTE["accent2"]
+            else:
+                break
             try:
-                score = scored[idx][0]
-                fg = PALETTE["muted"]
-                if score > 0.8:
-                    fg = PALETTE["accent"]
-                elif score > 0.6:
-                    fg = PALETTE["accent2"]
                 self.listbox.itemconfig(idx, fg=fg)
             except Exception:
                 # some Tk builds don't support itemconfig; ignore
-                pass
+                break
 
         if self.results:
             self.listbox.selection_clear(0, tk.END)
@@ -177,8 +265,23 @@ class SearchableDropdown:
             self.listbox.see(0)
 
     def on_key(self, event):
-        txt = self.entry_var.get().strip()
-        self.update_list(txt)
+        txt = event.widget.get().strip()
+        if txt == self._last_text and self._pending_after is None:
+            # navigation/modifier keys: the list already matches this text
+            return
+        # debounce: a burst of keystrokes triggers a single fetch + rescore
+        self._cancel_pending()
+        self._pending_text = txt
+        self._pending_after = self.win.after(self.DEBOUNCE_MS, self._run_pending)
+
+    def _run_pending(self):
+        self._pending_after = None
+        self.update_list(self._pending_text)
+
+    def _cancel_pending(self):
+        if self._pending_after is not None:
+            self.win.after_cancel(self._pending_after)
+            self._pending_after = None
 
     def move(self, delta):
         size = self.listbox.size()
@@ -197,14 +300,12 @@ class SearchableDropdown:
         self.listbox.selection_set(idx)
         self.listbox.activate(idx)
         self.listbox.see(idx)
-        try:
-            label = self.listbox.get(idx)
-            self.entry_var.set(label)
-            self.entry.icursor(tk.END)
-        except Exception:
-            pass
 
     def confirm_selection(self):
+        if self._pending_after is not None:
+            # typed faster than the debounce: refresh now so Enter picks from the current text
+            self._cancel_pending()
+            self.update_list(self.entry.get().strip())
         sel = self.listbox.curselection()
         if not sel:
             messagebox.showwarning("Select", "Please select an item.")
@@ -217,6 +318,7 @@ class SearchableDropdown:
             self.close()
 
     def close(self):
+        self._cancel_pending()
         try:
             self.win.grab_release()
         except Exception:
@@ -264,6 +366,7 @@ class LoginWindow:
         if not username or not password:
             messagebox.showwarning("Input", "Enter username and password.")
             return
+        database.ensure_default_admin()
         ok = database.verify_user(username, password)
         if ok:
             role = database.get_user_role(username) or "staff"
@@ -295,6 +398,30 @@ class LibraryApp:
     def __init__(self, root, username):
         self.root = root
         self.username = username
+        self._closed = False
+        # fingerprint of the rows each Treeview currently shows (see _repopulate)
+        self._tree_fp = {}
+        # rows of lazily rendered trees, how many are inserted so far and their item ids
+        # when keyed (see _populate_lazy / _populate_keyed)
+        self._lazy_rows = {}
+        self._current_frame = None
+        # bumped by every action that changes books/members/loans; invalidates cached analytics
+        self._data_epoch = 0
+        self._analytics_cache = {}
+        # (epoch, rows) of the last full loans fetch, see _get_loans_for_export
+        self._loans_cache = None
+        # login name -> member row (or None), see _member_for_login
+        self._member_by_key = {}
+        # search paging state (see _build_search); set here so refresh_all can read it
+        # before the Search frame exists
+        self._search_text = None
+        self._search_token = 0
+        self._search_offset = 0
+        self._search_more = False
+        self._search_loading = False
+        # Settings page values, read when that page is first built; saves update it in
+        # place and refresh_all re-reads it off the Tk thread
+        self._settings = {}
         self.role = database.get_user_role(username) or "staff"  # default to staff
         self.root.title(f"Library System — {username} ({self.role})")
         self.root.geometry("1180x760")
@@ -318,58 +445,85 @@ class LibraryApp:
         items = [("Dashboard","dashboard"),("Search Books","search"),("Borrow/Return","borrow"),
                  ("Manage Books","manage"),("Members","members"),("Transactions","transactions")]
         for label, key in items:
-            ctk.CTkButton(self.sidebar, text=label, command=lambda k=key: self.show_frame(k)).pack(fill="x", padx=12, pady=6)
+            ctk.CTkButton(self.sidebar, text=label, command=partial(self.show_frame, key)).pack(fill="x", padx=12, pady=6)
 
         # admin-only
         if self.role == "admin":
-            ctk.CTkButton(self.sidebar, text="Audit Log", command=lambda: self.show_frame("audit")).pack(fill="x", padx=12, pady=6)
-            ctk.CTkButton(self.sidebar, text="Settings / Admin", command=lambda: self.show_frame("settings")).pack(fill="x", padx=12, pady=6)
+            ctk.CTkButton(self.sidebar, text="Audit Log", command=partial(self.show_frame, "audit")).pack(fill="x", padx=12, pady=6)
+            ctk.CTkButton(self.sidebar, text="Settings / Admin", command=partial(self.show_frame, "settings")).pack(fill="x", padx=12, pady=6)
         else:
             # staff: still show settings (for password change / SMTP read-only)
-            ctk.CTkButton(self.sidebar, text="Settings", command=lambda: self.show_frame("settings")).pack(fill="x", padx=12, pady=6)
+            ctk.CTkButton(self.sidebar, text="Settings", command=partial(self.show_frame, "settings")).pack(fill="x", padx=12, pady=6)
 
         # logout button
         ctk.CTkButton(self.sidebar, text="Logout", fg_color=PALETTE["danger"], command=self.logout).pack(side="bottom", fill="x", padx=12, pady=12)
-
-        # build frames
-        self._build_dashboard()
-        self._build_search()
-        self._build_borrow()
-        self._build_manage()
-        self._build_members()
-        self._build_transactions()
-        self._build_audit()
-        self._build_settings()
+        # reloads every built frame, picking up changes made outside this session
+        ctk.CTkButton(self.sidebar, text="Refresh", command=self.refresh_all).pack(side="bottom", fill="x", padx=12, pady=6)
+
+        # frames are built the first time they are shown, and loaded each time they are shown
+        self._builders = {
+            "dashboard": self._build_dashboard, "search": self._build_search, "borrow": self._build_borrow,
+            "manage": self._build_manage, "members": self._build_members, "transactions": self._build_transactions,
+            "audit": self._build_audit, "settings": self._build_settings,
+        }
+        self._built = set()
+        self._dirty = set()
+        self._flush_pending = False
+        self._loaders = {
+            "dashboard": (self.draw_dashboard,),
+            "search": (self.load_books_into_tree,),
+            "borrow": (self.load_books_for_borrow, self.load_active_loans),
+            "members": (self.load_members,),
+            "transactions": (self.load_transactions,),
+            "audit": (self.load_audit,),
+            "settings": (self.load_settings,),
+        }
+        # book to select once the borrow tree is next repopulated (see open_borrow_modal)
+        self._borrow_select_id = None
 
         # show default
         self.show_frame("dashboard")
-        self.refresh_all()
+
+    def _ensure_built(self, name):
+        if name not in self._built:
+            self._builders[name]()
+            self._built.add(name)
 
     def show_frame(self, name):
+        self._ensure_built(name)
         frame = self.frames[name]
         frame.tkraise()
+        self._current_frame = name
         # refresh frame-specific content
-        if name == "dashboard":
-            self.draw_dashboard()
-        elif name == "search":
-            self.load_books_into_tree()
-        elif name == "borrow":
-            self.load_books_for_borrow()
-            self.load_active_loans()
-        elif name == "members":
-            self.load_members()
-        elif name == "transactions":
-            self.load_transactions()
-        elif name == "audit":
-            self.load_audit()
-        elif name == "settings":
-            self.load_settings()
+        for load in self._loaders.get(name, ()):
+            load()
+
+    def _mark_dirty(self, *names):
+        # coalesces reloads requested by one action into a single pass on the next idle tick
+        self._dirty.update(names)
+        if not self._flush_pending:
+            self._flush_pending = True
+            self.root.after_idle(self._flush_dirty)
+
+    def _flush_dirty(self):
+        self._flush_pending = False
+        if self._closed:
+            return
+        dirty, self._dirty = self._dirty, set()
+        # only the visible frame is reloaded now; show_frame reloads the others when raised
+        if self._current_frame in dirty:
+            for load in self._loaders.get(self._current_frame, ()):
+                load()
 
     def logout(self):
         if messagebox.askyesno("Confirm", "Logout and return to login?"):
-            self.root.destroy()
-            # restart app (simple approach)
-            os.execl(sys.executable, sys.executable, *sys.argv)
+            # tear down this session in-process and reuse the same root for the next login
+            self._closed = True
+            for w in self.root.winfo_children():
+                w.destroy()
+            self.root.withdraw()
+            root = self.root
+            LoginWindow(root, partial(start_session, root))
 
     # ---------------- Dashboard ----------------
     def _build_dashboard(self):
@@ -392,45 +546,101 @@ class LibraryApp:
         self.ax = self.fig.add_subplot(111)
         self.canvas = FigureCanvasTkAgg(self.fig, master=chart_frame)
         self.canvas.get_tk_widget().pack(fill="both", expand=True)
+        # artists kept between redraws so a refresh only updates their data
+        self._chart_kind = None
+        self._bars = None
+        self._trend_line = None
+        self._trend_fill = None
+        self._trend_labels = None
 
     def draw_dashboard(self):
-        totals = database.analytics_totals()
+        self._run_bg(self._fetch_dashboard, self._render_dashboard)
+
+    def _fetch_dashboard(self):
+        # worker thread: every query the dashboard needs, no widget access
+        data = {"totals": self._cached_analytics(database.analytics_totals)}
+        # if logged-in user maps to a library member (by email or name), show member loans
+        data["member"] = member = self._member_for_login(self.username)
+        if member:
+            data["counts"] = database.member_loan_counts(member["id"])
+        else:
+            data["trend"] = self._cached_analytics(database.analytics_loans_by_month, 6)
+        return data
+
+    def _cached_analytics(self, fn, *args):
+        # reuses fn(*args) until ANALYTICS_TTL passes or the data epoch moves on
+        key = (fn.__name__, args, self._data_epoch)
+        now = time.monotonic()
+        hit = self._analytics_cache.get(key)
+        if hit and now - hit[1] < ANALYTICS_TTL:
+            return hit[0]
+        value = fn(*args)
+        self._analytics_cache[key] = (value, now)
+        return value
+
+    def _mark_data_changed(self):
+        self._data_epoch += 1
+        self._analytics_cache.clear()
+
+    def _member_for_login(self, login):
+        # database.get_member_by_login, memoised per lower-cased login (misses included);
+        # add_member_action clears it. Safe to call from worker threads.
+        key = (login or "").lower()
+        try:
+            return self._member_by_key[key]
+        except KeyError:
+            member = self._member_by_key[key] = database.get_member_by_login(key)
+            return member
+
+    def _render_dashboard(self, data):
+        totals = data["totals"]
         self.total_books_lbl.configure(text=f"Books: {totals['books']}")
         self.total_members_lbl.configure(text=f"Members: {totals['members']}")
         self.active_loans_lbl.configure(text=f"Active loans: {totals['active_loans']}")
 
-        # if logged-in user maps to a library member (by email or name), show member loans
-        member = None
-        for m in database.list_members():
-            if (m.get("email") and m["email"].lower() == self.username.lower()) or (m.get("name") and m["name"].lower() == self.username.lower()):
-                member = m
-                break
+        if self._current_frame != "dashboard":
+            # user already moved on; show_frame redraws when the dashboard is raised again
+            return
 
+        member = data["member"]
         if member:
-            # Member dashboard: show this member's active and recent loans in chart form + table
-            loans = [l for l in database.list_loans(show_all=True) if l["member_id"] == member["id"]]
-            recent = loans[:10]
-            # make a small bar of borrowed vs returned counts
-            borrowed_count = len(loans)
-            returned_count = sum(1 for l in loans if l["date_returned"])
-            self.ax.clear()
-            labels = ["Borrowed", "Returned"]
+            # Member dashboard: show this member's borrowed vs returned counts in chart form
+            borrowed_count, returned_count = data["counts"]
             vals = [borrowed_count, returned_count]
-            colors = [PALETTE["accent"], PALETTE["accent2"]]
-            self.ax.bar(labels, vals, color=colors)
+            if self._chart_kind == "bars":
+                for bar, v in zip(self._bars, vals):
+                    bar.set_height(v)
+                self.ax.relim()
+                self.ax.autoscale_view()
+            else:
+                self.ax.clear()
+                labels = ["Borrowed", "Returned"]
+                colors = [PALETTE["accent"], PALETTE["accent2"]]
+                self._bars = self.ax.bar(labels, vals, color=colors)
+                self._chart_kind = "bars"
             self.ax.set_title(f"{member['name']}'s Loans (total {borrowed_count})")
-            self.canvas.draw()
         else:
             # Staff / Admin dashboard: show loans trend
-            data = database.analytics_loans_by_month(months=6)
-            labels = [t for (t,_) in data]
-            values = [v for (_,v) in data]
-            self.ax.clear()
-            self.ax.plot(labels, values, marker="o", color=PALETTE["accent"], linewidth=2)
-            self.ax.fill_between(labels, values, color=PALETTE["accent2"], alpha=0.12)
-            self.ax.set_title("Loans (last 6 months)")
-            self.ax.grid(alpha=0.25)
-            self.canvas.draw()
+            trend = data["trend"]
+            labels = [t for (t,_) in trend]
+            values = [v for (_,v) in trend]
+            if self._chart_kind == "trend" and labels == self._trend_labels:
+                # same months: move the existing line and rebuild only the fill under it
+                self._trend_line.set_ydata(values)
+                self._trend_fill.remove()
+                self._trend_fill = self.ax.fill_between(labels, values, color=PALETTE["accent2"], alpha=0.12)
+                self.ax.relim()
+                self.ax.update_datalim([(0, 0)])
+                self.ax.autoscale_view()
+            else:
+                self.ax.clear()
+                self._trend_line, = self.ax.plot(labels, values, marker="o", color=PALETTE["accent"], linewidth=2)
+                self._trend_fill = self.ax.fill_between(labels, values, color=PALETTE["accent2"], alpha=0.12)
+                self.ax.set_title("Loans (last 6 months)")
+                self.ax.grid(alpha=0.25)
+                self._chart_kind = "trend"
+                self._trend_labels = labels
+        self.canvas.draw_idle()
 
     # ---------------- Search Frame ----------------
     def _build_search(self):
@@ -448,6 +658,11 @@ class LibraryApp:
         self.search_tree, self.search_vsb = self.make_tree(tree_frame, cols, heads)
         self.search_tree.pack(side="left", fill="both", expand=True)
         self.search_vsb.pack(side="right", fill="y")
+        # results are fetched a page at a time; scrolling near the end loads the next page
+        self.search_tree.configure(yscrollcommand=self._on_search_scroll)
+        # live search: re-query shortly after typing stops
+        self._search_after = None
+        self.search_var.trace_add("write", self._on_search_typed)
 
         # interactions
         self.search_tree.bind("<Double-1>", self.on_search_double)
@@ -458,15 +673,71 @@ class LibraryApp:
             self.search_tree.bind("<Button-3>", self.on_search_right_click)
 
     def on_search(self):
+        if self._search_after is not None:
+            self.root.after_cancel(self._search_after)
+            self._search_after = None
         text = self.search_var.get().strip()
         self._load_books(search_text=text)
 
+    def _on_search_typed(self, *_):
+        if self._search_after is not None:
+            self.root.after_cancel(self._search_after)
+        self._search_after = self.root.after(SEARCH_DEBOUNCE_MS, self._run_live_search)
+
+    def _run_live_search(self):
+        self._search_after = None
+        text = self.search_var.get().strip()
+        if text != (self._search_text or ""):
+            self._load_books(search_text=text)
+
     def _load_books(self, search_text=None):
-        for r in self.search_tree.get_children():
-            self.search_tree.delete(r)
-        rows = database.list_books(search_text)
+        self._search_text = search_text
+        token = self._new_search_token()
+        self._run_bg(database.list_books, partial(self._populate_search_tree, token),
+                     search_text, limit=SEARCH_PAGE_SIZE, errback=partial(self._search_failed, token))
+
+    def _new_search_token(self):
+        # every fetch of a first page starts a new result generation; pages and first
+        # pages fetched for an older one are dropped when they arrive
+        self._search_token += 1
+        self._search_loading = True
+        return self._search_token
+
+    def _search_failed(self, token):
+        # a failed fetch must not leave paging blocked until the next search
+        if token == self._search_token:
+            self._search_loading = False
+
+    def _populate_search_tree(self, token, rows):
+        if token != self._search_token:
+            # a newer search was started while this one was loading
+            return
+        self._repopulate(self.search_tree, map(book_values, rows))
+        self._search_offset = len(rows)
+        self._search_more = len(rows) == SEARCH_PAGE_SIZE
+        self._search_loading = False
+
+    def _on_search_scroll(self, first, last):
+        self.search_vsb.set(first, last)
+        if self._search_more and not self._search_loading and float(last) > 0.9:
+            self._search_loading = True
+            token = self._search_token
+            self._run_bg(database.list_books, partial(self._append_search_page, token),
+                         self._search_text, limit=SEARCH_PAGE_SIZE, offset=self._search_offset,
+                         errback=partial(self._search_failed, token))
+
+    def _append_search_page(self, token, rows):
+        if token != self._search_token:
+            # a newer search replaced the tree while this page was loading
+            return
+        # the tree no longer matches the first-page fingerprint
+        self._tree_fp.pop(str(self.search_tree), None)
+        insert = self.search_tree.insert
         for r in rows:
-            self.search_tree.insert("", "end", values=(r["id"], r["title"], r.get("author",""), r.get("category",""), r.get("isbn",""), "Yes" if r["available"] else "No"))
+            insert("", "end", values=book_values(r))
+        self._search_offset += len(rows)
+        self._search_more = len(rows) == SEARCH_PAGE_SIZE
+        self._search_loading = False
 
     def load_books_into_tree(self):
         self._load_books(None)
@@ -485,8 +756,8 @@ class LibraryApp:
             vals = self.search_tree.item(iid, "values")
             book_id = int(vals[0])
             menu = tk.Menu(self.root, tearoff=0)
-            menu.add_command(label="Borrow", command=lambda b=book_id: self.open_borrow_modal(b))
-            menu.add_command(label="Edit", command=lambda b=book_id: self.open_edit_from_book(b))
+            menu.add_command(label="Borrow", command=partial(self.open_borrow_modal, book_id))
+            menu.add_command(label="Edit", command=partial(self.open_edit_from_book, book_id))
             try:
                 menu.tk_popup(event.x_root, event.y_root)
             finally:
@@ -495,8 +766,9 @@ class LibraryApp:
     def open_edit_from_book(self, book_id):
         b = database.get_book(book_id)
         if b:
-            self.title_var.set(b["title"]); self.author_var.set(b.get("author",""))
-            self.category_var.set(b.get("category","")); self.isbn_var.set(b.get("isbn",""))
+            self._ensure_built("manage")
+            self.title_var.set(b["title"]); self.author_var.set(b["author"] or "")
+            self.category_var.set(b["category"] or ""); self.isbn_var.set(b["isbn"] or "")
             self.selected_book_id.set(book_id)
             self.show_frame("manage")
 
@@ -545,11 +817,18 @@ class LibraryApp:
         SearchableDropdown(self.root, fetch_fn=database.search_members_by_text, on_select=on_select, title="Search member...")
 
     def load_books_for_borrow(self):
-        for r in self.borrow_tree.get_children():
-            self.borrow_tree.delete(r)
-        rows = database.list_books()
-        for r in rows:
-            self.borrow_tree.insert("", "end", values=(r["id"], r["title"], r.get("author",""), r.get("category",""), r.get("isbn",""), "Yes" if r["available"] else "No"))
+        self._run_bg(database.list_books, self._populate_borrow_tree)
+
+    def _populate_borrow_tree(self, rows):
+        iids = self._repopulate(self.borrow_tree, map(book_values, rows))
+        select_id = self._borrow_select_id
+        self._borrow_select_id = None
+        if select_id is not None:
+            for r, iid in zip(rows, iids):
+                if r["id"] == select_id:
+                    self.borrow_tree.selection_set(iid)
+                    self.borrow_tree.see(iid)
+                    break
 
     def borrow_action(self):
         sel = self.borrow_tree.selection()
@@ -566,11 +845,14 @@ class LibraryApp:
             return
         member_id = self.borrow_selected_member["id"]
         days = int(self.borrow_days.get())
-        res = database.borrow_book(book_id, member_id, days_due=days, actor=self.username)
+        self._run_bg(database.borrow_book, self._on_borrowed, book_id, member_id, days_due=days, actor=self.username)
+
+    def _on_borrowed(self, res):
         if res["success"]:
+            self._mark_data_changed()
             messagebox.showinfo("Borrowed", res["message"])
             # refresh
-            self.load_books_for_borrow(); self.load_books_into_tree(); self.load_active_loans()
+            self._mark_dirty("borrow", "search")
             # clear selection
             self.borrow_selected_member = None
             self.borrow_member_display.set("")
@@ -578,13 +860,11 @@ class LibraryApp:
             messagebox.showerror("Error", res["message"])
 
     def load_active_loans(self):
-        for r in self.loan_tree.get_children():
-            self.loan_tree.delete(r)
-        loans = database.list_loans(show_all=False)
-        for l in loans:
-            borrowed = datetime.fromisoformat(l["date_borrowed"]).strftime("%Y-%m-%d")
-            due = datetime.fromisoformat(l["date_due"]).strftime("%Y-%m-%d")
-            self.loan_tree.insert("", "end", values=(l["loan_id"], l["book_title"], l["member_name"], borrowed, due))
+        self._run_bg(database.list_loans, self._populate_loan_tree, show_all=False)
+
+    def _populate_loan_tree(self, loans):
+        # dates arrive already formatted by list_loans
+        self._repopulate(self.loan_tree, ((l["loan_id"], l["book_title"], l["member_name"], l["borrowed_day"], l["due_day"]) for l in loans))
 
     def return_action(self):
         sel = self.loan_tree.selection()
@@ -593,24 +873,22 @@ class LibraryApp:
             return
         vals = self.loan_tree.item(sel[0], "values")
         loan_id = int(vals[0])
-        res = database.return_book(loan_id, actor=self.username)
+        self._run_bg(database.return_book, self._on_returned, loan_id, actor=self.username)
+
+    def _on_returned(self, res):
         if res["success"]:
+            self._mark_data_changed()
             messagebox.showinfo("Returned", res["message"])
-            self.load_active_loans(); self.load_books_for_borrow(); self.load_books_into_tree(); self.load_transactions()
+            self._mark_dirty("borrow", "search", "transactions")
         else:
             messagebox.showerror("Error", res["message"])
 
     def open_borrow_modal(self, book_id):
         # convenience: open borrow modal preselecting book (we use existing borrow frame flow)
         # select book in tree and switch to borrow frame
+        # the borrow tree reloads in the background; the row is selected once it is repopulated
+        self._borrow_select_id = book_id
         self.show_frame("borrow")
-        # find and select the book row in borrow_tree
-        for iid in self.borrow_tree.get_children():
-            vals = self.borrow_tree.item(iid, "values")
-            if int(vals[0]) == book_id:
-                self.borrow_tree.selection_set(iid)
-                self.borrow_tree.see(iid)
-                break
 
     # ---------------- Manage Frame (books) ----------------
     def _build_manage(self):
@@ -641,9 +919,10 @@ class LibraryApp:
             messagebox.showwarning("Input", "Title is required.")
             return
         database.add_book(title, self.author_var.get().strip(), self.category_var.get().strip(), self.isbn_var.get().strip(), actor=self.username)
+        self._mark_data_changed()
         messagebox.showinfo("Added", "Book added.")
         self.clear_manage_form()
-        self.load_books_into_tree()
+        self._mark_dirty("search")
 
     def update_book_action(self):
         bid = self.selected_book_id.get()
@@ -651,9 +930,10 @@ class LibraryApp:
             messagebox.showwarning("Select", "Double-click a book from Search to load it for editing.")
             return
         database.update_book(bid, self.title_var.get().strip(), self.author_var.get().strip(), self.category_var.get().strip(), self.isbn_var.get().strip(), True, actor=self.username)
+        self._mark_data_changed()
         messagebox.showinfo("Updated", "Book updated.")
         self.clear_manage_form()
-        self.load_books_into_tree()
+        self._mark_dirty("search")
 
     def delete_book_action(self):
         bid = self.selected_book_id.get()
@@ -663,8 +943,9 @@ class LibraryApp:
         if messagebox.askyesno("Confirm", "Delete this book?"):
             res = database.delete_book(bid, actor=self.username)
             if res["success"]:
+                self._mark_data_changed()
                 messagebox.showinfo("Deleted", res["message"])
-                self.clear_manage_form(); self.load_books_into_tree()
+                self.clear_manage_form(); self._mark_dirty("search")
             else:
                 messagebox.showerror("Could not delete", res["message"])
 
@@ -699,15 +980,17 @@ class LibraryApp:
             messagebox.showwarning("Invalid", "Email format looks invalid.")
             return
         database.add_member(name, email, actor=self.username)
+        self._mark_data_changed()
+        self._member_by_key.clear()
         messagebox.showinfo("Added", "Member added.")
         self.mname_var.set(""); self.memail_var.set("")
-        self.load_members()
+        self._mark_dirty("members")
 
     def load_members(self):
-        for r in self.member_tree.get_children():
-            self.member_tree.delete(r)
-        for m in database.list_members():
-            self.member_tree.insert("", "end", values=(m["id"], m["name"], m.get("email","")))
+        self._run_bg(database.list_members, self._populate_member_tree)
+
+    def _populate_member_tree(self, members):
+        self._repopulate(self.member_tree, ((m["id"], m["name"], m["email"] or "") for m in members))
 
     # ---------------- Transactions / Export ----------------
     def _build_transactions(self):
@@ -718,8 +1001,8 @@ class LibraryApp:
         self.export_from = ctk.StringVar(); ctk.CTkEntry(controls, textvariable=self.export_from).grid(row=0,column=1,padx=6,pady=6)
         ctk.CTkLabel(controls, text="To (YYYY-MM-DD)").grid(row=0,column=2,padx=6,pady=6)
         self.export_to = ctk.StringVar(); ctk.CTkEntry(controls, textvariable=self.export_to).grid(row=0,column=3,padx=6,pady=6)
-        ctk.CTkButton(controls, text="Export CSV", command=lambda: self.export_transactions_range("csv")).grid(row=0,column=4,padx=6)
-        ctk.CTkButton(controls, text="Export XLSX", command=lambda: self.export_transactions_range("xlsx")).grid(row=0,column=5,padx=6)
+        ctk.CTkButton(controls, text="Export CSV", command=partial(self.export_transactions_range, "csv")).grid(row=0,column=4,padx=6)
+        ctk.CTkButton(controls, text="Export XLSX", command=partial(self.export_transactions_range, "xlsx")).grid(row=0,column=5,padx=6)
         ctk.CTkButton(controls, text="Download Import Template", command=self.save_import_template).grid(row=1,column=0,columnspan=2,pady=8)
 
         table_frame = ctk.CTkFrame(f); table_frame.pack(fill="both", expand=True, padx=12, pady=6)
@@ -727,72 +1010,97 @@ class LibraryApp:
         heads = ("Loan ID","Book","Member","Borrowed","Due","Returned","Late Fee")
         self.trans_tree, self.trans_vsb = self.make_tree(table_frame, cols, heads)
         self.trans_tree.pack(fill="both", expand=True); self.trans_vsb.pack(side="right", fill="y")
+        self.trans_tree.configure(yscrollcommand=self._lazy_scroll(self.trans_tree, self.trans_vsb))
 
     def export_transactions_range(self, fmt="csv"):
-        rows = database.get_all_loans_for_export()
         dfrom = self.export_from.get().strip(); dto = self.export_to.get().strip()
-        if dfrom or dto:
-            try:
-                dfrom_dt = datetime.fromisoformat(dfrom) if dfrom else None
-                dto_dt = datetime.fromisoformat(dto) if dto else None
-            except Exception:
-                messagebox.showerror("Invalid date", "Dates must be in YYYY-MM-DD format")
-                return
-            filtered = []
-            for r in rows:
-                borrowed = datetime.fromisoformat(r["date_borrowed"])
-                if dfrom_dt and borrowed < dfrom_dt: continue
-                if dto_dt and borrowed > dto_dt: continue
-                filtered.append(r)
-            rows = filtered
-
+        try:
+            # parsed once for validation, rounded out to whole days (the range is day
+            # granular: "To 2024-01-05" includes that whole day), then passed on as
+            # canonical ISO strings to compare like the stored ones
+            dfrom = datetime.fromisoformat(dfrom).replace(hour=0, minute=0, second=0, microsecond=0).isoformat() if dfrom else None
+            dto = datetime.fromisoformat(dto).replace(hour=23, minute=59, second=59, microsecond=999999).isoformat() if dto else None
+        except Exception:
+            messagebox.showerror("Invalid date", "Dates must be in YYYY-MM-DD format")
+            return
         if fmt == "csv":
             filename = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV files","*.csv")])
-            if not filename:
-                return
-            with open(filename, "w", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f); writer.writerow(["Loan ID","Book","Member","Borrowed","Due","Returned","Late Fee"])
-                for r in rows:
-                    borrowed = datetime.fromisoformat(r["date_borrowed"]).strftime("%Y-%m-%d")
-                    due = datetime.fromisoformat(r["date_due"]).strftime("%Y-%m-%d")
-                    returned_str = datetime.fromisoformat(r["date_returned"]).strftime("%Y-%m-%d") if r["date_returned"] else ""
-                    writer.writerow([r["loan_id"], r["book_title"], r["member_name"], borrowed, due, returned_str, r["late_fee"]])
-            database.log_audit(self.username, "export_csv", f"exported {len(rows)} transactions")
-            messagebox.showinfo("Exported", f"CSV saved to {filename}")
         else:
             filename = filedialog.asksaveasfilename(defaultextension=".xlsx", filetypes=[("Excel files","*.xlsx")])
-            if not filename:
-                return
-            wb = openpyxl.Workbook(); ws = wb.active; ws.title="Transactions"
-            ws.append(["Loan ID","Book","Member","Borrowed","Due","Returned","Late Fee"])
-            for r in rows:
-                borrowed = datetime.fromisoformat(r["date_borrowed"]).strftime("%Y-%m-%d")
-                due = datetime.fromisoformat(r["date_due"]).strftime("%Y-%m-%d")
-                returned_str = datetime.fromisoformat(r["date_returned"]).strftime("%Y-%m-%d") if r["date_returned"] else ""
-                ws.append([r["loan_id"], r["book_title"], r["member_name"], borrowed, due, returned_str, r["late_fee"]])
-            wb.save(filename)
-            database.log_audit(self.username, "export_xlsx", f"exported {len(rows)} transactions")
-            messagebox.showinfo("Exported", f"XLSX saved to {filename}")
+        if not filename:
+            return
+        # everything the worker needs is decided here; it never touches Tk widgets
+        threading.Thread(target=self._export_worker, args=(fmt, filename, dfrom, dto), daemon=True).start()
+
+    def _export_worker(self, fmt, filename, dfrom, dto):
+        try:
+            count = self._write_export(fmt, filename, dfrom, dto)
+            database.log_audit(self.username, f"export_{fmt}", f"exported {count} transactions")
+        except Exception as e:
+            self.root.after(0, messagebox.showerror, "Export failed", f"Could not export: {e}")
+            return
+        finally:
+            # this thread's connection is not reused once the export is done
+            database.close_connection()
+        self.root.after(0, messagebox.showinfo, "Exported", f"{fmt.upper()} saved to {filename}")
+
+    def _write_export(self, fmt, filename, dfrom, dto):
+        # the date range is applied in SQL; rows are streamed from the cursor in
+        # fetchmany() batches while writing, never held as one big list
+        batches = database.iter_loan_batches_for_export(dfrom, dto)
+        count = 0
+
+        if fmt == "csv":
+            with open(filename, "w", newline="", encoding="utf-8", buffering=1 << 20) as f:
+                writer = csv.writer(f); writer.writerow(["Loan ID","Book","Member","Borrowed","Due","Returned","Late Fee"])
+                # writerows loops over the mapped rows in C
+                for batch in batches:
+                    writer.writerows(map(loan_values, batch))
+                    count += len(batch)
+        else:
+            # constant_memory flushes each row to disk as it is written, so memory stays
+            # flat however many transactions are exported. Titles and names are written
+            # verbatim: no URL or formula detection (a title starting with "=" must not
+            # become a live formula).
+            wb = xlsxwriter.Workbook(filename, {"constant_memory": True, "strings_to_urls": False,
+                                                "strings_to_formulas": False})
+            ws = wb.add_worksheet("Transactions")
+            ws.write_row(0, 0, ("Loan ID","Book","Member","Borrowed","Due","Returned","Late Fee"))
+            write_row = ws.write_row
+            for batch in batches:
+                for i, r in enumerate(batch, count + 1):
+                    write_row(i, 0, loan_values(r))
+                count += len(batch)
+            wb.close()
+        return count
 
     def save_import_template(self):
         filename = filedialog.asksaveasfilename(defaultextension=".xlsx", filetypes=[("Excel files","*.xlsx")])
         if not filename:
             return
-        wb = openpyxl.Workbook(); ws = wb.active; ws.title = "Books import"
-        ws.append(["title","author","category","isbn"])
+        # write-only: rows are serialised as appended, no in-memory cell graph
+        wb = openpyxl.Workbook(write_only=True); ws = wb.create_sheet(title="Books import")
+        ws.append(("title","author","category","isbn"))
         wb.save(filename)
         database.log_audit(self.username, "download_template", "books_import_template")
         messagebox.showinfo("Template saved", f"Template saved to {filename}")
 
     def load_transactions(self):
-        for r in self.trans_tree.get_children():
-            self.trans_tree.delete(r)
+        self._run_bg(self._get_loans_for_export, self._populate_trans_tree)
+
+    def _get_loans_for_export(self):
+        # all loans, reused until a write in this session bumps the data epoch
+        # (refresh_all bumps it too, to pick up changes from elsewhere)
+        cached = self._loans_cache
+        if cached and cached[0] == self._data_epoch:
+            return cached[1]
+        epoch = self._data_epoch
         rows = database.get_all_loans_for_export()
-        for r in rows:
-            borrowed = datetime.fromisoformat(r["date_borrowed"]).strftime("%Y-%m-%d")
-            due = datetime.fromisoformat(r["date_due"]).strftime("%Y-%m-%d")
-            returned_str = datetime.fromisoformat(r["date_returned"]).strftime("%Y-%m-%d") if r["date_returned"] else ""
-            self.trans_tree.insert("", "end", values=(r["loan_id"], r["book_title"], r["member_name"], borrowed, due, returned_str, r["late_fee"]))
+        self._loans_cache = (epoch, rows)
+        return rows
+
+    def _populate_trans_tree(self, rows):
+        self._populate_lazy(self.trans_tree, map(loan_values, rows))
 
     # ---------------- Audit Log (admin) ----------------
     def _build_audit(self):
@@ -807,6 +1115,7 @@ class LibraryApp:
         cols = ("id","actor","action","details","created_at"); heads = ("ID","Actor","Action","Details","When")
         self.audit_tree, self.audit_vsb = self.make_tree(table_frame, cols, heads)
         self.audit_tree.pack(fill="both", expand=True); self.audit_vsb.pack(side="right", fill="y")
+        self.audit_tree.configure(yscrollcommand=self._lazy_scroll(self.audit_tree, self.audit_vsb))
 
     def load_audit(self):
         since_txt = self.audit_since.get().strip()
@@ -817,39 +1126,41 @@ class LibraryApp:
             except Exception:
                 messagebox.showerror("Invalid", "Since date must be YYYY-MM-DD")
                 return
-        rows = database.query_audit(limit=500, since=since)
-        for r in self.audit_tree.get_children():
-            self.audit_tree.delete(r)
-        for a in rows:
-            self.audit_tree.insert("", "end", values=(a["id"], a["actor"], a["action"], a["details"], a["created_at"]))
+        self._run_bg(database.query_audit, self._populate_audit_tree, limit=500, since=since)
+
+    def _populate_audit_tree(self, rows):
+        # audit rows never change once written, so the row id is a stable item id
+        self._populate_keyed(self.audit_tree, ((str(a["id"]), (a["id"], a["actor"], a["action"], a["details"], a["created_at"]))
+                                               for a in rows))
 
     # ---------------- Settings / Admin ----------------
     def _build_settings(self):
         f = self.frames["settings"]
         ctk.CTkLabel(f, text="Settings & Admin", font=("Arial", 18, "bold")).pack(pady=8)
         sfrm = ctk.CTkFrame(f); sfrm.pack(padx=12, pady=12, fill="x")
+        self._settings = database.get_settings(SETTINGS_KEYS)
 
         # late fee
         ctk.CTkLabel(sfrm, text="Late fee per day").grid(row=0, column=0, sticky="w", padx=6, pady=6)
-        self.late_fee_var = ctk.DoubleVar(value=float(database.get_setting("late_fee_per_day") or 0.50))
+        self.late_fee_var = ctk.DoubleVar(value=float(self.get_setting("late_fee_per_day", 0.50)))
         ctk.CTkEntry(sfrm, textvariable=self.late_fee_var).grid(row=0, column=1, padx=6, pady=6)
         ctk.CTkButton(sfrm, text="Save", command=self.save_settings).grid(row=0, column=2, padx=6)
 
         # SMTP settings (editable by admin)
         ctk.CTkLabel(sfrm, text="SMTP Host").grid(row=1, column=0, sticky="w", padx=6, pady=6)
-        self.smtp_host_var = ctk.StringVar(value=database.get_setting("smtp_host") or "")
+        self.smtp_host_var = ctk.StringVar(value=self.get_setting("smtp_host", ""))
         ctk.CTkEntry(sfrm, textvariable=self.smtp_host_var).grid(row=1, column=1, padx=6, pady=6)
 
         ctk.CTkLabel(sfrm, text="SMTP Port").grid(row=2, column=0, sticky="w", padx=6, pady=6)
-        self.smtp_port_var = ctk.StringVar(value=database.get_setting("smtp_port") or "587")
+        self.smtp_port_var = ctk.StringVar(value=self.get_setting("smtp_port", "587"))
         ctk.CTkEntry(sfrm, textvariable=self.smtp_port_var).grid(row=2, column=1, padx=6, pady=6)
 
         ctk.CTkLabel(sfrm, text="SMTP User (from address)").grid(row=3, column=0, sticky="w", padx=6, pady=6)
-        self.smtp_user_var = ctk.StringVar(value=database.get_setting("smtp_user") or "")
+        self.smtp_user_var = ctk.StringVar(value=self.get_setting("smtp_user", ""))
         ctk.CTkEntry(sfrm, textvariable=self.smtp_user_var).grid(row=3, column=1, padx=6, pady=6)
 
         ctk.CTkLabel(sfrm, text="SMTP Password").grid(row=4, column=0, sticky="w", padx=6, pady=6)
-        self.smtp_pw_var = ctk.StringVar(value=database.get_setting("smtp_password") or "")
+        self.smtp_pw_var = ctk.StringVar(value=self.get_setting("smtp_password", ""))
         ctk.CTkEntry(sfrm, textvariable=self.smtp_pw_var, show="*").grid(row=4, column=1, padx=6, pady=6)
 
         ctk.CTkButton(sfrm, text="Save SMTP Settings", command=self.save_smtp_settings).grid(row=5, column=0, padx=6, pady=(8,0))
@@ -880,19 +1191,27 @@ class LibraryApp:
             ctk.CTkButton(sfrm, text="Reset Password", command=self.admin_reset_action).grid(row=18, column=0, columnspan=2, pady=8)
 
     def save_settings(self):
-        v = self.late_fee_var.get()
         try:
-            float(v)
-        except Exception:
+            # a DoubleVar parses the entry itself: get() returns a float or raises
+            v = self.late_fee_var.get()
+        except tk.TclError:
             messagebox.showerror("Invalid", "Late fee must be a number")
             return
         database.set_setting("late_fee_per_day", str(v), actor=self.username)
+        self._settings["late_fee_per_day"] = str(v)
         messagebox.showinfo("Saved", "Settings saved.")
         database.log_audit(self.username, "save_settings", f"late_fee_per_day={v}")
 
     def save_smtp_settings(self):
         host = self.smtp_host_var.get().strip(); port = self.smtp_port_var.get().strip()
         user = self.smtp_user_var.get().strip(); pw = self.smtp_pw_var.get().strip()
+        if port:
+            try:
+                # parsed once here; stored in canonical form so the mailer's int() never fails
+                port = str(int(port))
+            except ValueError:
+                messagebox.showerror("Invalid", "SMTP port must be a number")
+                return
         if not host or not port or not user:
             if not messagebox.askyesno("Confirm", "Host/Port/User empty — this will clear SMTP settings. Continue?"):
                 return
@@ -900,6 +1219,7 @@ class LibraryApp:
         database.set_setting("smtp_port", port, actor=self.username)
         database.set_setting("smtp_user", user, actor=self.username)
         database.set_setting("smtp_password", pw, actor=self.username)
+        self._settings.update(smtp_host=host, smtp_port=port, smtp_user=user, smtp_password=pw)
         messagebox.showinfo("Saved", "SMTP settings saved.")
         database.log_audit(self.username, "save_smtp", f"host={host} user={user}")
 
@@ -910,13 +1230,24 @@ class LibraryApp:
             messagebox.showwarning("No recipient", "Set 'SMTP User' before testing (we will send test mail to that address).")
             return
 
-        def _do_test():
-            res = mailer.send_email(cfg_user, "Library SMTP test", "This is a test email from Library System.")
-            if res.get("success"):
-                messagebox.showinfo("SMTP Test", "Test email sent successfully (check inbox).")
-            else:
-                messagebox.showerror("SMTP Test failed", f"Failed to send test: {res.get('message')}")
-        threading.Thread(target=_do_test, daemon=True).start()
+        self._send_email_async([(cfg_user, "Library SMTP test", "This is a test email from Library System.")],
+                               ok_title="SMTP Test", ok_msg="Test email sent successfully (check inbox).",
+                               err_title="SMTP Test failed")
+
+    def _send_email_async(self, messages, ok_title="Sent", ok_msg=None, err_title=None):
+        # SMTP handshakes can take seconds: the mailer's worker sends the (to, subject, body)
+        # messages and the outcome is reported on the Tk thread; without ok_msg/err_title
+        # the send stays silent (best-effort)
+        future = mailer.send_emails_async(messages)
+        future.add_done_callback(lambda f: self.root.after(0, self._on_email_sent, f, ok_title, ok_msg, err_title))
+
+    def _on_email_sent(self, future, ok_title, ok_msg, err_title):
+        failed = [r for r in future.result() if not r["success"]]
+        if not failed:
+            if ok_msg:
+                messagebox.showinfo(ok_title, ok_msg)
+        elif err_title:
+            messagebox.showerror(err_title, f"Failed to send: {failed[0].get('message')}")
 
     def change_password_action(self):
         cur = self.current_pw.get(); new = self.new_pw.get(); conf = self.confirm_pw.get()
@@ -926,20 +1257,22 @@ class LibraryApp:
         if new != conf:
             messagebox.showwarning("Mismatch", "New passwords do not match")
             return
-        res = database.change_user_password(self.username, cur, new)
+        # bcrypt verify + hash take a few hundred ms; run them off the Tk thread
+        future = database.change_user_password_async(self.username, cur, new)
+        future.add_done_callback(lambda f: self.root.after(0, self._on_password_changed, f))
+
+    def _on_password_changed(self, future):
+        try:
+            res = future.result()
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not change password: {e}")
+            return
         if res["success"]:
-            # background best-effort send confirmation
-            def _send_confirm():
-                # try find a member record with email == username OR name == username
-                recipient = None
-                for m in database.list_members():
-                    if m.get("email") and m["email"].lower() == self.username.lower():
-                        recipient = m["email"]; break
-                    if m.get("name") and m["name"].lower() == self.username.lower():
-                        recipient = m.get("email"); break
-                if recipient:
-                    mailer.send_password_change_email(self.username, recipient)
-            threading.Thread(target=_send_confirm, daemon=True).start()
+            # background best-effort send confirmation to the member record with
+            # email == username OR name == username
+            member = self._member_for_login(self.username)
+            if member and member["email"]:
+                self._send_email_async([mailer.password_change_message(self.username, member["email"])])
 
             messagebox.showinfo("Changed", res["message"])
             database.log_audit(self.username, "change_password", "user changed own password")
@@ -964,17 +1297,20 @@ class LibraryApp:
         if not target or not new:
             messagebox.showwarning("Input", "Username & new password required")
             return
-        res = database.admin_reset_password(self.username, target, new)
+        future = database.admin_reset_password_async(self.username, target, new)
+        future.add_done_callback(lambda f: self.root.after(0, self._on_admin_reset, f, target))
+
+    def _on_admin_reset(self, future, target):
+        try:
+            res = future.result()
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not reset password: {e}")
+            return
         if res["success"]:
             # best-effort send notification
-            def _send_reset():
-                recipient = None
-                for m in database.list_members():
-                    if (m.get("email") and m["email"].lower() == target.lower()) or (m.get("name") and m["name"].lower() == target.lower()):
-                        recipient = m.get("email"); break
-                if recipient:
-                    mailer.send_admin_reset_email(self.username, target, recipient)
-            threading.Thread(target=_send_reset, daemon=True).start()
+            member = self._member_for_login(target)
+            if member and member["email"]:
+                self._send_email_async([mailer.admin_reset_message(self.username, target, member["email"])])
 
             messagebox.showinfo("Reset", res["message"])
             database.log_audit(self.username, "admin_reset_password", f"reset for {target}")
@@ -987,76 +1323,185 @@ class LibraryApp:
         tree = ttk.Treeview(parent, columns=columns, show="headings", selectmode="browse")
         for col, head in zip(columns, headings):
             tree.heading(col, text=head)
-            tree.column(col, width=120, anchor="w")
+            tree.column(col, **_DEFAULT_COL)
         vsb = ttk.Scrollbar(parent, orient="vertical", command=tree.yview)
         tree.configure(yscrollcommand=vsb.set)
         return tree, vsb
 
-    def refresh_all(self):
-        self.draw_dashboard(); self.load_books_into_tree(); self.load_books_for_borrow(); self.load_members(); self.load_active_loans(); self.load_transactions(); self.load_audit(); self.load_settings()
-
-    # wrappers (some loaders used above)
-    def load_books_for_borrow(self):
-        for r in self.borrow_tree.get_children():
-            self.borrow_tree.delete(r)
-        for b in database.list_books():
-            self.borrow_tree.insert("", "end", values=(b["id"], b["title"], b.get("author",""), b.get("category",""), b.get("isbn",""), "Yes" if b["available"] else "No"))
-
-    def load_books_into_tree(self):
-        self._load_books(None)
-
-    def load_active_loans(self):
-        for r in self.loan_tree.get_children():
-            self.loan_tree.delete(r)
-        loans = database.list_loans(show_all=False)
-        for l in loans:
-            borrowed = datetime.fromisoformat(l["date_borrowed"]).strftime("%Y-%m-%d")
-            due = datetime.fromisoformat(l["date_due"]).strftime("%Y-%m-%d")
-            self.loan_tree.insert("", "end", values=(l["loan_id"], l["book_title"], l["member_name"], borrowed, due))
-
-    def load_members(self):
-        for r in self.member_tree.get_children():
-            self.member_tree.delete(r)
-        for m in database.list_members():
-            self.member_tree.insert("", "end", values=(m["id"], m["name"], m.get("email","")))
-
-    def load_transactions(self):
-        for r in self.trans_tree.get_children():
-            self.trans_tree.delete(r)
-        rows = database.get_all_loans_for_export()
-        for r in rows:
-            borrowed = datetime.fromisoformat(r["date_borrowed"]).strftime("%Y-%m-%d")
-            due = datetime.fromisoformat(r["date_due"]).strftime("%Y-%m-%d")
-            returned_str = datetime.fromisoformat(r["date_returned"]).strftime("%Y-%m-%d") if r["date_returned"] else ""
-            self.trans_tree.insert("", "end", values=(r["loan_id"], r["book_title"], r["member_name"], borrowed, due, returned_str, r["late_fee"]))
+    def _repopulate(self, tree, values_seq):
+        # clears the tree with a single delete call, then inserts every row;
+        # returns the item ids in row order. An identical row set (e.g. re-entering
+        # a tab with no changes) leaves the tree untouched.
+        values = list(values_seq)
+        fp = hash(tuple(values))
+        key = str(tree)
+        children = tree.get_children()
+        if self._tree_fp.get(key) == fp and len(children) == len(values):
+            return list(children)
+        # hide every column while rebuilding so Tk does not lay out cells row by row
+        shown = tree["displaycolumns"]
+        tree.configure(displaycolumns=())
+        try:
+            if children:
+                tree.delete(*children)
+            insert = tree.insert
+            iids = [insert("", "end", values=v) for v in values]
+        finally:
+            tree.configure(displaycolumns=shown)
+        self._tree_fp[key] = fp
+        return iids
+
+    def _populate_lazy(self, tree, values_seq):
+        # shows the first LAZY_CHUNK rows now; the rest are inserted by _lazy_scroll
+        # as the user scrolls toward them
+        values = list(values_seq)
+        self._repopulate(tree, values[:LAZY_CHUNK])
+        self._lazy_rows[str(tree)] = (values, min(LAZY_CHUNK, len(values)), None)
+
+    def _populate_keyed(self, tree, keyed_rows):
+        # _populate_lazy for (iid, values) rows that never change under the same iid and
+        # arrive in a stable order: instead of rebuilding, only items no longer in the first
+        # chunk are deleted and only missing ones inserted, so a refresh that adds a few
+        # rows touches a few items
+        rows = list(keyed_rows)
+        head = rows[:LAZY_CHUNK]
+        keep = {iid for iid, _ in head}
+        children = tree.get_children()
+        stale = [iid for iid in children if iid not in keep]
+        if stale:
+            tree.delete(*stale)
+        present = set(children).difference(stale)
+        insert = tree.insert
+        for i, (iid, v) in enumerate(head):
+            if iid not in present:
+                # the kept items are in the same relative order, so index i is its slot
+                insert("", i, iid=iid, values=v)
+        key = str(tree)
+        self._tree_fp.pop(key, None)
+        self._lazy_rows[key] = ([v for _, v in rows], len(head), [iid for iid, _ in rows])
+
+    def _lazy_scroll(self, tree, vsb):
+        # yscrollcommand for a _populate_lazy tree: keeps the scrollbar in sync and
+        # appends the next chunk once the view nears the end of what is inserted
+        key = str(tree)
+        def on_scroll(first, last):
+            vsb.set(first, last)
+            values, pos, iids = self._lazy_rows.get(key, ((), 0, None))
+            if pos < len(values) and float(last) > 0.9:
+                end = pos + LAZY_CHUNK
+                self._lazy_rows[key] = (values, end, iids)
+                # the tree now holds more than the fingerprinted first chunk
+                self._tree_fp.pop(key, None)
+                insert = tree.insert
+                if iids is None:
+                    for v in values[pos:end]:
+                        insert("", "end", values=v)
+                else:
+                    for iid, v in zip(iids[pos:end], values[pos:end]):
+                        insert("", "end", iid=iid, values=v)
+        return on_scroll
+
+    def _run_bg(self, fn, cb, *args, errback=None, **kwargs):
+        # runs fn on the DB worker and hands its result to cb on the Tk thread;
+        # widgets are only ever touched from cb. If fn raises, errback (when given)
+        # runs instead of cb, before the error is shown.
+        future = _db_pool.submit(fn, *args, **kwargs)
+        future.add_done_callback(lambda f: self.root.after(0, self._deliver_bg, f, cb, errback))
+
+    def _deliver_bg(self, future, cb, errback=None):
+        if self._closed:
+            # finished after logout; the widgets it would fill are gone
+            return
+        exc = future.exception()
+        if exc is not None:
+            if errback is not None:
+                errback()
+            messagebox.showerror("Error", str(exc))
+            return
+        cb(future.result())
 
-    def load_active_loans(self):
-        # already implemented above, keep simple alias
-        self.load_active_loans = lambda: None
+    def refresh_all(self):
+        # one background pass reads everything the built frames show, then a single
+        # Tk-side step applies it; the books list is read once for both book trees.
+        # Cached analytics, loans and member lookups are dropped so everything is re-read.
+        self._mark_data_changed()
+        self._member_by_key.clear()
+        names = [n for n in self._loaders if n in self._built]
+        audit_since = None
+        if "audit" in names:
+            since_txt = self.audit_since.get().strip()
+            try:
+                audit_since = datetime.fromisoformat(since_txt) if since_txt else None
+            except ValueError:
+                # load_audit reports the bad date when the user refreshes that tab
+                names.remove("audit")
+        search_token = self._new_search_token() if "search" in names else None
+        self._run_bg(self._fetch_all, self._apply_refresh, names, self._search_text, search_token, audit_since,
+                     errback=partial(self._search_failed, search_token))
+
+    def _fetch_all(self, names, search_text, search_token, audit_since):
+        # worker thread: queries only, no widget access
+        data = {}
+        books = None
+        if "borrow" in names:
+            books = database.list_books()
+            data["borrow"] = (books, database.list_loans(show_all=False))
+        if "search" in names:
+            if not search_text and books is not None:
+                data["search"] = (search_token, books[:SEARCH_PAGE_SIZE])
+            else:
+                data["search"] = (search_token, database.list_books(search_text, limit=SEARCH_PAGE_SIZE))
+        if "members" in names:
+            data["members"] = database.list_members()
+        if "transactions" in names:
+            data["transactions"] = self._get_loans_for_export()
+        if "audit" in names:
+            data["audit"] = database.query_audit(limit=500, since=audit_since)
+        if "settings" in names:
+            data["settings"] = database.get_settings(SETTINGS_KEYS)
+        if "dashboard" in names:
+            data["dashboard"] = self._fetch_dashboard()
+        return data
+
+    def _apply_refresh(self, data):
+        if "dashboard" in data:
+            self._render_dashboard(data["dashboard"])
+        if "search" in data:
+            self._populate_search_tree(*data["search"])
+        if "borrow" in data:
+            books, loans = data["borrow"]
+            self._populate_borrow_tree(books)
+            self._populate_loan_tree(loans)
+        if "members" in data:
+            self._populate_member_tree(data["members"])
+        if "transactions" in data:
+            self._populate_trans_tree(data["transactions"])
+        if "audit" in data:
+            self._populate_audit_tree(data["audit"])
+        if "settings" in data:
+            self._settings = data["settings"]
+            self.load_settings()
 
-    def load_audit(self):
-        # implemented in show_frame -> load_audit call
-        pass
+    def get_setting(self, key, default=None):
+        # session copy of a Settings page value (see self._settings)
+        return self._settings.get(key) or default
 
     def load_settings(self):
-        self.late_fee_var.set(float(database.get_setting("late_fee_per_day") or 0.50))
-        self.smtp_host_var.set(database.get_setting("smtp_host") or "")
-        self.smtp_port_var.set(database.get_setting("smtp_port") or "587")
-        self.smtp_user_var.set(database.get_setting("smtp_user") or "")
-        self.smtp_pw_var.set(database.get_setting("smtp_password") or "")
+        self.late_fee_var.set(float(self.get_setting("late_fee_per_day", 0.50)))
+        self.smtp_host_var.set(self.get_setting("smtp_host", ""))
+        self.smtp_port_var.set(self.get_setting("smtp_port", "587"))
+        self.smtp_user_var.set(self.get_setting("smtp_user", ""))
+        self.smtp_pw_var.set(self.get_setting("smtp_password", ""))
 
 # ---------------------------
 # Application start
 # ---------------------------
+def start_session(root, username):
+    root.deiconify()
+    LibraryApp(root, username)
+
 if __name__ == "__main__":
-    import sys
     root = tk.Tk()
     root.withdraw()
-
-    def on_login_success(user):
-        root.deiconify()
-        app = LibraryApp(root, user)
-        root.mainloop()
-
-    LoginWindow(root, on_login_success)
+    LoginWindow(root, partial(start_session, root))
     root.mainloop()